@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compare the accurate and fast modes of the feature extractors of
+`stem_mixer.features`: time per stem and agreement between both modes.
+
+Runs on the synthetic corpus (see `corpus.py`), or on a folder of stems
+with `--data_home`.
+
+usage: python benchmarks/bench_features.py --output features.json
+"""
+import argparse
+import glob
+import json
+import os
+import tempfile
+import time
+
+import librosa
+
+from corpus import write_corpus
+from stem_mixer import features
+
+FEATURES = ["sound_class", "tempo", "first_beat"]
+
+
+def _beat_grid(stem_path, sr):
+    analysis = features.Analysis.from_file(stem_path, sr=sr)
+    _, beat_frames = analysis.beat_track
+    return librosa.frames_to_time(beat_frames, sr=sr)
+
+
+def _agree(name, accurate, fast, stem_path, sr):
+    if name == "tempo":
+        return abs(fast - accurate) <= features.TEMPO_TOLERANCE * accurate
+
+    if name == "first_beat":
+        # mixing aligns the first beats, so it has to be on the beat grid
+        return fast is not None and any(
+            abs(fast - t) <= 0.05 for t in _beat_grid(stem_path, sr)
+        )
+
+    return accurate == fast
+
+
+def run(stem_paths, feature_names=FEATURES, sr=22050):
+    results = []
+    for name in feature_names:
+        values = {}
+        seconds = {}
+
+        for mode in features.MODES:
+            # the first call compiles the numba code of librosa, keep it out
+            # of the timings
+            features.extract(stem_paths[0], [name], sr=sr, modes={name: mode})
+
+            start = time.perf_counter()
+            values[mode] = [
+                features.extract(path, [name], sr=sr, modes={name: mode})[name]
+                for path in stem_paths
+            ]
+            seconds[mode] = (time.perf_counter() - start) / len(stem_paths)
+
+        agreement = sum(
+            _agree(name, a, b, path, sr)
+            for a, b, path in zip(values["accurate"], values["fast"], stem_paths)
+        ) / len(stem_paths)
+
+        results.append(
+            {
+                "feature": name,
+                "n_stems": len(stem_paths),
+                "seconds_per_stem": seconds,
+                "speedup": seconds["accurate"] / seconds["fast"],
+                "agreement": agreement,
+            }
+        )
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="bench_features.py", description="Benchmark feature extraction modes"
+    )
+    parser.add_argument(
+        "--data_home", default=None, help="folder of stems. default: synthetic corpus"
+    )
+    parser.add_argument(
+        "--n_stems", type=int, default=16, help="stems in the synthetic corpus"
+    )
+    parser.add_argument(
+        "--duration", type=float, default=60.0, help="synthetic stem duration in seconds"
+    )
+    parser.add_argument(
+        "--output", default=None, help="JSON file with the results. default: stdout"
+    )
+
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as corpus:
+        data_home = args.data_home
+        if data_home is None:
+            data_home = corpus
+            write_corpus(data_home, args.n_stems, args.duration)
+
+        results = run(sorted(glob.glob(os.path.join(data_home, "*.wav"))))
+
+    for r in results:
+        print(
+            f"{r['feature']}: fast mode {r['speedup']:.1f}x faster, "
+            f"{r['agreement']:.0%} agreement on {r['n_stems']} stems"
+        )
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+    else:
+        print(json.dumps(results, indent=4))
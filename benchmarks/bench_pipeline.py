@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Throughput of the preprocessing and mixing pipelines on a synthetic corpus
+(see `corpus.py`).
+
+* process: `metadata.process` stems per second, with the time per stage
+* select: `select_stems` latency for indexes of increasing size, plus the
+  time to build the `StemSampler` of each index
+* generate: `generate_mixtures` mixtures per second, with the time per stage
+
+Results are written as JSON. With `--compare`, the throughput is checked
+against a previous result and the script exits with an error if any of
+them regressed by more than `--tolerance`.
+
+usage: python benchmarks/bench_pipeline.py --output results.json
+       python benchmarks/bench_pipeline.py --compare baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import librosa
+import numpy as np
+
+from corpus import synthetic_index, write_corpus
+from stem_mixer import metadata
+from stem_mixer.mix import generate_mixtures, select_stems
+from stem_mixer.sampler import StemSampler
+
+SELECT_SIZES = [100, 1000, 10000, 100000]
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "librosa": librosa.__version__,
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def _read_profile(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def bench_process(data_home, workers=1):
+    profile = os.path.join(data_home, "process_profile.json")
+    n_stems = len([f for f in os.listdir(data_home) if f.endswith(".wav")])
+
+    start = time.perf_counter()
+    metadata.process(data_home, workers=workers, profile=profile)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "n_stems": n_stems,
+        "workers": workers,
+        "seconds": elapsed,
+        "stems_per_second": n_stems / elapsed,
+        "stages": _read_profile(profile),
+    }
+
+
+def bench_select(sizes=SELECT_SIZES, repeats=200, n_harmonic=2, n_percussive=2):
+    results = []
+
+    for size in sizes:
+        index = synthetic_index(size)
+
+        start = time.perf_counter()
+        sampler = StemSampler(index)
+        build_seconds = time.perf_counter() - start
+
+        rng = np.random.default_rng(0)
+        latencies = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            select_stems(n_percussive, n_harmonic, "corpus", None, rng=rng, sampler=sampler)
+            latencies.append(time.perf_counter() - start)
+
+        latencies = np.array(latencies) * 1000
+        results.append(
+            {
+                "index_size": size,
+                "build_seconds": build_seconds,
+                "latency_ms_mean": float(latencies.mean()),
+                "latency_ms_p50": float(np.percentile(latencies, 50)),
+                "latency_ms_p99": float(np.percentile(latencies, 99)),
+            }
+        )
+
+    return results
+
+
+def bench_generate(data_home, n_mixtures=20, duration=5.0, workers=1, n_harmonic=1,
+                   n_percussive=1):
+    profile = os.path.join(data_home, "generate_profile.json")
+    output_folder = os.path.join(data_home, "mixtures")
+
+    start = time.perf_counter()
+    generate_mixtures(
+        data_home,
+        n_mixtures,
+        n_harmonic + n_percussive,
+        n_harmonic,
+        n_percussive,
+        duration,
+        output_folder=output_folder,
+        seed=0,
+        workers=workers,
+        profile=profile,
+    )
+    elapsed = time.perf_counter() - start
+
+    return {
+        "n_mixtures": n_mixtures,
+        "duration": duration,
+        "workers": workers,
+        "seconds": elapsed,
+        "mixtures_per_second": n_mixtures / elapsed,
+        "stages": _read_profile(profile),
+    }
+
+
+def run(n_stems=40, stem_duration=10.0, n_mixtures=20, duration=5.0, workers=1,
+        select_sizes=SELECT_SIZES):
+    with tempfile.TemporaryDirectory() as data_home:
+        write_corpus(data_home, n_stems, stem_duration)
+
+        return {
+            "environment": environment(),
+            "process": bench_process(data_home, workers),
+            "select": bench_select(select_sizes),
+            "generate": bench_generate(data_home, n_mixtures, duration, workers),
+        }
+
+
+def throughputs(results):
+    r"""
+    higher-is-better metrics of a result, by name
+    """
+    metrics = {
+        "process.stems_per_second": results["process"]["stems_per_second"],
+        "generate.mixtures_per_second": results["generate"]["mixtures_per_second"],
+    }
+    for r in results["select"]:
+        metrics[f"select.{r['index_size']}.calls_per_second"] = 1000 / r["latency_ms_p50"]
+
+    return metrics
+
+
+def compare(results, baseline, tolerance=0.1):
+    r"""
+    Print the throughput ratios against `baseline`.
+
+    Returns
+    -------
+    regressions : list[str]
+        metrics slower than the baseline by more than `tolerance`
+    """
+    current, previous = throughputs(results), throughputs(baseline)
+    regressions = []
+
+    for name, value in current.items():
+        if name not in previous:
+            continue
+
+        ratio = value / previous[name]
+        print(f"  {name}: {ratio:.2f}x baseline")
+
+        if ratio < 1 - tolerance:
+            regressions.append(name)
+
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="bench_pipeline.py", description="Benchmark preprocessing and mixing"
+    )
+    parser.add_argument("--n_stems", type=int, default=40, help="stems in the corpus")
+    parser.add_argument(
+        "--stem_duration", type=float, default=10.0, help="stem duration in seconds"
+    )
+    parser.add_argument("--n_mixtures", type=int, default=20, help="mixtures to generate")
+    parser.add_argument(
+        "--duration", type=float, default=5.0, help="mixture duration in seconds"
+    )
+    parser.add_argument("--workers", type=int, default=1, help="worker processes")
+    parser.add_argument(
+        "--select_sizes",
+        default=",".join(str(s) for s in SELECT_SIZES),
+        help="comma-separated index sizes for the select_stems benchmark",
+    )
+    parser.add_argument(
+        "--output", default=None, help="JSON file with the results. default: stdout"
+    )
+    parser.add_argument(
+        "--compare", default=None, help="JSON results of a previous run to compare with"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="relative throughput loss allowed by --compare",
+    )
+
+    args = parser.parse_args()
+    results = run(
+        args.n_stems,
+        args.stem_duration,
+        args.n_mixtures,
+        args.duration,
+        args.workers,
+        [int(s) for s in args.select_sizes.split(",")],
+    )
+
+    print(f"process: {results['process']['stems_per_second']:.2f} stems/s")
+    for r in results["select"]:
+        print(
+            f"select ({r['index_size']} stems): {r['latency_ms_p50']:.3f}ms median, "
+            f"sampler built in {r['build_seconds']:.3f}s"
+        )
+    print(f"generate: {results['generate']['mixtures_per_second']:.2f} mixtures/s")
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+    else:
+        print(json.dumps(results, indent=4))
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+        regressions = compare(results, baseline, args.tolerance)
+        if len(regressions) > 0:
+            print(f"throughput regressed: {', '.join(regressions)}")
+            sys.exit(1)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compare the throughput and quality of the time stretch backends of
+`stem_mixer.mix.stretch_audio`.
+
+Quality is measured against the phase vocoder output, which is the
+reference:
+
+* onset_correlation: correlation between onset envelopes, i.e. how well the
+  rhythm is preserved (1.0 is identical)
+* mel_distance_db: mean absolute difference between log-mel spectrograms,
+  which also captures pitch changes (0.0 is identical)
+
+usage: python benchmarks/bench_stretch.py --output stretch.json
+"""
+import argparse
+import json
+import time
+
+import librosa
+import numpy as np
+
+from stem_mixer.mix import STRETCH_BACKENDS, stretch_audio
+
+RATES = [0.5, 1.0, 1.004, 1.25, 2.0, 4.0]
+
+
+def synthetic_stem(duration=10.0, bpm=120, sr=22050):
+    r"""
+    clicks on every beat plus one decaying note per beat
+    """
+    t = np.arange(int(duration * sr)) / sr
+    beat = np.mod(t, 60 / bpm)
+    clicks = np.exp(-beat * 200) * np.random.default_rng(0).uniform(-1, 1, len(t))
+    notes = np.exp(-beat * 8) * np.sin(2 * np.pi * 220 * t)
+
+    return (0.5 * clicks + 0.5 * notes).astype(np.float32)
+
+
+def _onset_correlation(y, reference, sr):
+    a = librosa.onset.onset_strength(y=y, sr=sr)
+    b = librosa.onset.onset_strength(y=reference, sr=sr)
+    n = min(len(a), len(b))
+    return float(np.corrcoef(a[:n], b[:n])[0, 1])
+
+
+def _mel_distance(y, reference, sr):
+    a = librosa.power_to_db(librosa.feature.melspectrogram(y=y, sr=sr))
+    b = librosa.power_to_db(librosa.feature.melspectrogram(y=reference, sr=sr))
+    n = min(a.shape[1], b.shape[1])
+    return float(np.mean(np.abs(a[:, :n] - b[:, :n])))
+
+
+def run(duration=10.0, repeats=5, sr=22050):
+    audio = synthetic_stem(duration, sr=sr)
+    results = []
+
+    for rate in RATES:
+        reference, _ = stretch_audio(audio, rate, sr=sr, backend="phase_vocoder")
+
+        for backend in STRETCH_BACKENDS:
+            start = time.perf_counter()
+            for _ in range(repeats):
+                stretched, applied_rate = stretch_audio(
+                    audio, rate, sr=sr, backend=backend
+                )
+            elapsed = (time.perf_counter() - start) / repeats
+
+            results.append(
+                {
+                    "backend": backend,
+                    "rate": rate,
+                    "applied_rate": applied_rate,
+                    "seconds": elapsed,
+                    "realtime_factor": duration / elapsed,
+                    "onset_correlation": _onset_correlation(stretched, reference, sr),
+                    "mel_distance_db": _mel_distance(stretched, reference, sr),
+                }
+            )
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="bench_stretch.py", description="Benchmark time stretch backends"
+    )
+    parser.add_argument(
+        "--duration", type=float, default=10.0, help="stem duration in seconds"
+    )
+    parser.add_argument(
+        "--repeats", type=int, default=5, help="repetitions per measurement"
+    )
+    parser.add_argument(
+        "--output", default=None, help="JSON file with the results. default: stdout"
+    )
+
+    args = parser.parse_args()
+    results = run(args.duration, args.repeats)
+
+    for r in results:
+        print(
+            f"{r['backend']:>14} rate={r['rate']:<6} {r['realtime_factor']:8.1f}x "
+            f"realtime, onset corr {r['onset_correlation']:.3f}, "
+            f"mel dist {r['mel_distance_db']:.2f} dB"
+        )
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Deterministic synthetic stem corpus used by the benchmarks.
+
+Stems alternate between percussive clicks and harmonic tones at known
+tempos, so the features extracted from them are predictable and the corpus
+is identical on every machine.
+
+usage: python benchmarks/corpus.py --output corpus --n_stems 100
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+import soundfile as sf
+
+from stem_mixer.features import tempo_bin
+from stem_mixer.metadata import dict_template
+
+TEMPOS = [60, 90, 120, 140]
+SOUND_CLASSES = ["percussive", "harmonic"]
+INSTRUMENTS = {
+    "percussive": ["kick", "snare", "shaker", "tambourine"],
+    "harmonic": ["bass", "piano", "guitar", "strings"],
+}
+
+
+def stem_spec(i):
+    r"""
+    sound class, tempo and instrument of the `i`-th stem of the corpus
+    """
+    sound_class = SOUND_CLASSES[i % len(SOUND_CLASSES)]
+    tempo = TEMPOS[(i // len(SOUND_CLASSES)) % len(TEMPOS)]
+    instruments = INSTRUMENTS[sound_class]
+    instrument = instruments[(i // (len(SOUND_CLASSES) * len(TEMPOS))) % len(instruments)]
+
+    return sound_class, tempo, instrument
+
+
+def synthesize(sound_class, tempo, duration=10.0, sr=22050, seed=0):
+    r"""
+    clicks on every beat for percussive stems, one decaying note per beat
+    for harmonic stems. starts with a short silence
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * sr)) / sr
+    beat = np.mod(t, 60 / tempo)
+
+    if sound_class == "percussive":
+        y = np.exp(-beat * 200) * rng.uniform(-1, 1, len(t))
+    else:
+        frequency = 110 * 2 ** (rng.integers(0, 24) / 12)
+        y = np.exp(-beat * 8) * np.sin(2 * np.pi * frequency * t)
+
+    y[: int(0.1 * sr)] = 0
+
+    return (0.5 * y).astype(np.float32)
+
+
+def write_corpus(output_folder, n_stems, duration=10.0, sr=22050, seed=0):
+    r"""
+    Write `n_stems` synthetic WAV stems to `output_folder`.
+
+    Returns
+    -------
+    stem_names : list[str]
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    stem_names = []
+
+    for i in range(n_stems):
+        sound_class, tempo, _ = stem_spec(i)
+        stem_name = f"stem{i:06d}.wav"
+        y = synthesize(sound_class, tempo, duration, sr, seed=seed + i)
+        sf.write(os.path.join(output_folder, stem_name), y, sr)
+        stem_names.append(stem_name)
+
+    return stem_names
+
+
+def synthetic_index(n_stems, data_home="corpus"):
+    r"""
+    Index of a corpus of `n_stems`, built without writing any audio.
+
+    Returns
+    -------
+    index : pd.DataFrame
+    """
+    rows = []
+
+    for i in range(n_stems):
+        sound_class, tempo, instrument = stem_spec(i)
+        stem = dict_template(data_home, f"stem{i:06d}.wav")
+        stem.update(
+            tempo=float(tempo),
+            tempo_bin=tempo_bin(tempo),
+            sound_class=sound_class,
+            instrument_name=instrument,
+        )
+        rows.append(stem)
+
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="corpus.py", description="Write a synthetic stem corpus"
+    )
+    parser.add_argument("--output", required=True, help="folder of the corpus")
+    parser.add_argument("--n_stems", type=int, default=100, help="number of stems")
+    parser.add_argument(
+        "--duration", type=float, default=10.0, help="stem duration in seconds"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="corpus seed")
+
+    args = parser.parse_args()
+    write_corpus(args.output, args.n_stems, args.duration, seed=args.seed)
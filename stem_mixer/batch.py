@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. autosummary::
+   :toctree: generated/
+
+   pad_stack
+   apply_stretch
+   stretch_batch
+   first_beat_times
+   rms
+"""
+import collections
+
+import librosa
+import numpy as np
+
+
+def pad_stack(arrays, dtype=None):
+    r"""
+    Stack 1-D arrays of different lengths into a zero-padded 2-D array.
+
+    Parameters
+    ----------
+    arrays : list[np.ndarray]
+        1-D signals
+    dtype : np.dtype or None
+        dtype of the batch. if None, the common dtype of `arrays`
+
+    Returns
+    -------
+    batch : np.ndarray [shape=(len(arrays), max length)]
+    lengths : np.ndarray
+        length of each signal, in samples
+    """
+    lengths = np.array([len(a) for a in arrays], dtype=np.int64)
+
+    if dtype is None:
+        dtype = np.result_type(*arrays) if len(arrays) > 0 else np.float32
+
+    batch = np.zeros((len(arrays), lengths.max(initial=0)), dtype=dtype)
+
+    for row, a, n in zip(batch, arrays, lengths):
+        row[:n] = a
+
+    return batch, lengths
+
+
+def apply_stretch(audio, rate, sr=22050, method="phase_vocoder"):
+    r"""
+    Stretch `audio` by `rate` with a given method.
+
+    Parameters
+    ----------
+    audio : np.ndarray [shape=(..., n)]
+        a signal or a batch of signals
+    rate : float
+        stretch factor. > 1 speeds up, < 1 slows down
+    sr : int
+        sampling rate
+    method : str
+        "identity", "resample" or "phase_vocoder"
+
+    Returns
+    -------
+    stretched_audio : np.ndarray [shape=(..., m)]
+    """
+    if method == "identity":
+        return audio
+
+    if method == "resample":
+        return librosa.resample(audio, orig_sr=sr * rate, target_sr=sr)
+
+    return librosa.effects.time_stretch(audio, rate=rate)
+
+
+def _groups(keys):
+    # indices of the items sharing each key, in order of first appearance
+    groups = collections.defaultdict(list)
+
+    for i, key in enumerate(keys):
+        groups[key].append(i)
+
+    return groups.values()
+
+
+def stretch_batch(audios, rates, methods, sr=22050):
+    r"""
+    Stretch many signals with one librosa call per group of signals sharing
+    a method, a rate and a length.
+
+    Stacking amortizes the per-call overhead of librosa on short clips.
+    Signals are never zero-padded: every row of a batch is stretched
+    exactly as it would be on its own, so the result of a signal doesn't
+    depend on the other signals of the batch. Only signals with identical
+    method, rate and length are batched, which the stems of a real mixture
+    rarely share: most of them are stretched one by one.
+
+    Parameters
+    ----------
+    audios : list[np.ndarray]
+        1-D signals
+    rates : list[float]
+        stretch factor of each signal
+    methods : list[str]
+        stretch method of each signal, see `apply_stretch`
+    sr : int
+        sampling rate
+
+    Returns
+    -------
+    stretched_audios : list[np.ndarray]
+        in the same order as `audios`
+    """
+    stretched_audios = [None] * len(audios)
+    keys = [
+        (method, rate, len(audio)) for audio, rate, method in zip(audios, rates, methods)
+    ]
+
+    for indices in _groups(keys):
+        method, rate, _ = keys[indices[0]]
+
+        if method == "identity" or len(indices) == 1:
+            for i in indices:
+                stretched_audios[i] = apply_stretch(audios[i], rate, sr, method)
+            continue
+
+        stretched_batch = apply_stretch(
+            np.stack([audios[i] for i in indices]), rate, sr, method
+        )
+
+        for i, row in zip(indices, stretched_batch):
+            # copy, so the batch is released once every stem is sliced out
+            stretched_audios[i] = row.copy()
+
+    return stretched_audios
+
+
+def first_beat_times(audios, sr=22050):
+    r"""
+    Time of the first beat of each signal.
+
+    Signals of the same length are tracked in a single batch. Signals are
+    never zero-padded, since beat tracking normalizes the onset strength
+    over the whole signal and padding would move the beats. Signals of
+    different lengths, as most stems of a real mixture are, are tracked
+    one by one.
+
+    Parameters
+    ----------
+    audios : list[np.ndarray]
+        1-D signals
+    sr : int
+        sampling rate
+
+    Returns
+    -------
+    first_beat_times : np.ndarray
+        in seconds. 0 for signals where no beat was found
+    """
+    first_frames = np.zeros(len(audios), dtype=np.int64)
+
+    for indices in _groups([len(audio) for audio in audios]):
+        _, beats = librosa.beat.beat_track(
+            y=np.stack([audios[i] for i in indices]), sr=sr, sparse=False
+        )
+        # beats is a boolean (n_signals, n_frames) grid
+        first_frames[indices] = np.where(beats.any(axis=-1), beats.argmax(axis=-1), 0)
+
+    return librosa.frames_to_time(first_frames, sr=sr)
+
+
+def rms(audios, offsets=None):
+    r"""
+    RMS of each signal.
+
+    Each signal is reduced on its own, so no padded copy of the signals is
+    made.
+
+    Parameters
+    ----------
+    audios : list[np.ndarray]
+        1-D signals
+    offsets : list[int] or None
+        samples of leading silence of each signal, counted in its length
+
+    Returns
+    -------
+    rms : np.ndarray
+    """
+    if offsets is None:
+        offsets = [0] * len(audios)
+
+    # accumulated in float64, the signals are usually float32
+    energy = np.array(
+        [np.einsum("i,i->", y, y, dtype=np.float64) for y in audios], dtype=np.float64
+    )
+    lengths = np.array([len(y) for y in audios], dtype=np.int64) + np.asarray(
+        offsets, dtype=np.int64
+    )
+
+    return np.sqrt(energy / lengths)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. autosummary::
+   :toctree: generated/
+
+   AudioCache
+"""
+import collections
+import hashlib
+import os
+
+import numpy as np
+
+from stem_mixer.writers import atomic_write
+
+
+class AudioCache:
+    r"""
+    Two-tier cache for processed stem audio.
+
+    The first tier is an in-memory LRU limited by `max_bytes`. The optional
+    second tier stores every entry as a `.npy` file inside `cache_dir`, so it
+    survives between runs and is shared by worker processes.
+
+    Parameters
+    ----------
+    max_bytes : int
+        memory budget of the in-memory tier. 0 disables it
+    cache_dir : str or None
+        folder of the on-disk tier. if None, there's no on-disk tier
+    """
+
+    def __init__(self, max_bytes=256 * 2**20, cache_dir=None):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.nbytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def stats(self):
+        r"""
+        dict with the number of hits (memory and disk), misses and memory used
+        """
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "nbytes": self.nbytes,
+        }
+
+    def get(self, key):
+        r"""
+        Return the audio stored for `key`, or None if it's not cached.
+
+        Returned arrays are read-only, since they're shared between callers.
+        """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+        if self.cache_dir is not None:
+            try:
+                audio = np.load(self._path(key))
+            except (FileNotFoundError, ValueError, EOFError):
+                # ValueError / EOFError: partially written file from a killed
+                # run, treat it as missing
+                audio = None
+
+            if audio is not None:
+                self.disk_hits += 1
+                self._remember(key, audio)
+                return audio
+
+        self.misses += 1
+        return None
+
+    def put(self, key, audio):
+        r"""
+        Store `audio` under `key` in both tiers.
+        """
+        audio = self._remember(key, audio)
+
+        if self.cache_dir is not None:
+            # other workers may read the entry while it's written
+            with atomic_write(self._path(key)) as tmp_path:
+                with open(tmp_path, "wb") as f:
+                    np.save(f, audio)
+
+        return audio
+
+    def clear(self):
+        r"""
+        Drop every entry of the in-memory tier.
+        """
+        self._entries.clear()
+        self.nbytes = 0
+
+    def _remember(self, key, audio):
+        audio = np.asarray(audio)
+        audio.setflags(write=False)
+
+        if audio.nbytes > self.max_bytes:
+            return audio
+
+        if key in self._entries:
+            self.nbytes -= self._entries.pop(key).nbytes
+
+        self._entries[key] = audio
+        self.nbytes += audio.nbytes
+
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+        return audio
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.npy")
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. autosummary::
+   :toctree: generated/
+
+   MixtureDataset
+"""
+import itertools
+
+import numpy as np
+
+from stem_mixer import mix
+from stem_mixer.cache import AudioCache
+from stem_mixer.writers import stem_metadata
+
+try:
+    from torch.utils.data import IterableDataset, get_worker_info
+except ImportError:
+    # torch is optional: without it the dataset is a plain python iterable
+    IterableDataset = object
+    get_worker_info = None
+
+
+class MixtureDataset(IterableDataset):
+    r"""
+    Generate mixtures on the fly, without writing them to disk.
+
+    Iterating yields `(mixture, stems, metadata)` tuples, where `mixture` is
+    a float32 array with the mixture, `stems` is a float32 array of shape
+    `(n_stems, n_samples)` with the aligned stems and `metadata` is a dict
+    with the `mixture_id` and the metadata of each stem.
+
+    Mixture `i` is generated from `(seed, i)`, exactly like mixture `i` of
+    `mix.generate_mixtures` with the same seed. Mixtures are split between
+    shards (see `shard`) and, when used with a ``torch`` ``DataLoader``,
+    between its workers, so every mixture is generated exactly once.
+
+    Parameters
+    ----------
+    data_home : str
+        path to stems
+    n_harmonic : int
+        number of harmonic stems
+    n_percussive : int
+        number of percussive stems
+    duration : float
+        mixture duration
+    n_mixtures : int or None
+        number of mixtures. if None, iterate forever
+    seed : int
+        master seed
+    index_file : str
+        index file with pre-computed features
+    cache_size : int
+        memory budget, in bytes, of the stretched audio cache of each
+        worker. 0 disables the in-memory cache
+    cache_dir : str or None
+        folder for the on-disk stretched audio cache
+    stretch_backend : str
+        stretch backend, see `mix.stretch_audio`
+    """
+
+    def __init__(
+        self,
+        data_home,
+        n_harmonic,
+        n_percussive,
+        duration,
+        n_mixtures=None,
+        seed=0,
+        index_file="index.csv",
+        cache_size=0,
+        cache_dir=None,
+        stretch_backend="phase_vocoder",
+    ):
+        self.data_home = data_home
+        self.n_harmonic = n_harmonic
+        self.n_percussive = n_percussive
+        self.duration = duration
+        self.n_mixtures = n_mixtures
+        self.seed = seed
+        self.index_file = index_file
+        self.cache_size = cache_size
+        self.cache_dir = cache_dir
+        self.stretch_backend = stretch_backend
+
+        self.shard_id = 0
+        self.n_shards = 1
+
+        self.sampler = mix.load_sampler(data_home, index_file)
+        self._cache = None
+
+    def __len__(self):
+        if self.n_mixtures is None:
+            raise TypeError("MixtureDataset without n_mixtures has no length")
+
+        return self.n_mixtures
+
+    def shard(self, shard_id, n_shards):
+        r"""
+        Only generate the mixtures of a shard, e.g. for distributed training.
+
+        Parameters
+        ----------
+        shard_id : int
+            shard of this process, in `[0, n_shards)`
+        n_shards : int
+            total number of shards
+
+        Returns
+        -------
+        dataset : MixtureDataset
+            the dataset itself
+        """
+        if not 0 <= shard_id < n_shards:
+            raise ValueError(f"shard_id must be in [0, {n_shards})")
+
+        self.shard_id = shard_id
+        self.n_shards = n_shards
+
+        return self
+
+    def generate(self, mixture_index):
+        r"""
+        Generate a single mixture.
+
+        Parameters
+        ----------
+        mixture_index : int
+            position of the mixture
+
+        Returns
+        -------
+        mixture : np.ndarray
+        stems : np.ndarray
+        metadata : dict
+        """
+        if self._cache is None and (self.cache_size > 0 or self.cache_dir is not None):
+            self._cache = AudioCache(max_bytes=self.cache_size, cache_dir=self.cache_dir)
+
+        mixture_id, mixture, stems = mix.generate_mixture(
+            self.sampler,
+            self.data_home,
+            self.n_harmonic,
+            self.n_percussive,
+            self.duration,
+            self.seed,
+            mixture_index,
+            index_file=self.index_file,
+            cache=self._cache,
+            stretch_backend=self.stretch_backend,
+        )
+
+        stems_audio = np.stack([s["audio"] for s in stems])
+        metadata = {
+            "mixture_id": mixture_id,
+            "stems": [stem_metadata(s) for s in stems],
+        }
+
+        return mixture, stems_audio, metadata
+
+    def __iter__(self):
+        shard_id, n_shards = self.shard_id, self.n_shards
+
+        # split the shard again between the workers of a DataLoader
+        worker_info = get_worker_info() if get_worker_info is not None else None
+        if worker_info is not None:
+            shard_id = shard_id * worker_info.num_workers + worker_info.id
+            n_shards = n_shards * worker_info.num_workers
+
+        if self.n_mixtures is None:
+            indices = itertools.count(shard_id, n_shards)
+        else:
+            indices = range(shard_id, self.n_mixtures, n_shards)
+
+        for mixture_index in indices:
+            yield self.generate(mixture_index)
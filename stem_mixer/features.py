@@ -4,17 +4,377 @@
 .. autosummary::
    :toctree: generated/
 
+   Analysis
+   extract
    tempo
    tempo_bin
    sound_class
 """
+import functools
 import math
+import os
 
 import librosa
 import numpy as np
 
+from stem_mixer import profiling
 
-def tempo(stem_path, sr=22050):
+# excerpts analyzed by the fast extractors
+FAST_EXCERPTS = 3
+FAST_EXCERPT_DURATION = 5.0
+FAST_N_FFT = 1024
+# autocorrelation window of the tempogram, in seconds. a tempo estimated
+# from less audio, or from a flat onset envelope, is only the tempo prior
+TEMPO_WINDOW = 8.0
+# tempo estimation needs excerpts longer than the tempogram window
+FAST_TEMPO_EXCERPT_DURATION = 10.0
+# relative difference under which two tempos agree
+TEMPO_TOLERANCE = 0.04
+
+
+class Analysis:
+    r"""
+    Decoded audio of a single stem plus the intermediate representations
+    shared between feature extractors.
+
+    Every representation is computed lazily and at most once, so running
+    several extractors over the same ``Analysis`` decodes the file once and
+    computes the STFT once.
+
+    Parameters
+    ----------
+    y : np.ndarray
+        mono audio signal
+    sr : int
+        sampling rate of ``y``
+    values : dict or None
+        feature values already known, e.g. a tempo given by the dataset.
+        extractors depending on another feature read it from here
+    """
+
+    def __init__(self, y, sr, values=None):
+        self.y = y
+        self.sr = sr
+        self.values = dict(values or {})
+
+    @classmethod
+    def from_file(cls, stem_path, sr=22050):
+        r"""
+        Decode (and resample) an audio stem file.
+
+        Parameters
+        ----------
+        stem_path : str
+            path to the audio stem file.
+        sr : int
+            target sampling rate
+
+        Returns
+        -------
+        analysis : Analysis
+        """
+        y, sr = librosa.load(stem_path, sr=sr, mono=True)
+        return cls(y, sr)
+
+    @functools.cached_property
+    def stft(self):
+        return librosa.stft(self.y)
+
+    @functools.cached_property
+    def onset_envelope(self):
+        # same representation `librosa.beat.beat_track` builds from `y`, but
+        # computed from the shared STFT
+        mel = librosa.feature.melspectrogram(S=np.abs(self.stft) ** 2, sr=self.sr)
+        return librosa.onset.onset_strength(
+            S=librosa.power_to_db(mel), sr=self.sr, aggregate=np.median
+        )
+
+    @functools.cached_property
+    def beat_track(self):
+        return librosa.beat.beat_track(onset_envelope=self.onset_envelope, sr=self.sr)
+
+    @functools.cached_property
+    def trim(self):
+        _, (start, end) = librosa.effects.trim(self.y)
+        return start / self.sr, end / self.sr
+
+    @functools.cached_property
+    def excerpt_onset_envelopes(self):
+        # onset strength of a few excerpts, the first one starts right after
+        # the leading silence. excerpts of short stems overlap rather than
+        # getting too short for the tempogram
+        duration = FAST_TEMPO_EXCERPT_DURATION
+        return [
+            librosa.onset.onset_strength(y=excerpt, sr=self.sr)
+            for excerpt in _excerpts(self, FAST_EXCERPTS, duration, duration)
+        ]
+
+    @functools.cached_property
+    def excerpt_tempos(self):
+        # tempo of the stem estimated from the excerpts, and of every excerpt
+        # on its own, read from a single tempogram of all of them. NaN for
+        # excerpts shorter than the tempogram window or without onsets
+        envelopes = self.excerpt_onset_envelopes
+        win_length = int(librosa.time_to_frames(TEMPO_WINDOW, sr=self.sr))
+        tempogram = librosa.feature.tempogram(
+            onset_envelope=np.concatenate(envelopes), sr=self.sr, win_length=win_length
+        )
+        tempo = librosa.feature.tempo(tg=tempogram, sr=self.sr)
+
+        excerpt_tempos = []
+        bounds = np.cumsum([0] + [len(envelope) for envelope in envelopes])
+        for envelope, start, end in zip(envelopes, bounds[:-1], bounds[1:]):
+            if len(envelope) < win_length or np.ptp(envelope) == 0:
+                excerpt_tempos.append(np.nan)
+            else:
+                tg = tempogram[:, start:end]
+                excerpt_tempos.append(librosa.feature.tempo(tg=tg, sr=self.sr)[0])
+
+        return float(tempo[0]), np.array(excerpt_tempos)
+
+    @functools.cached_property
+    def hpss(self):
+        stft_harmonic, stft_percussive = librosa.decompose.hpss(self.stft)
+        harmonic = librosa.istft(stft_harmonic, length=len(self.y), dtype=self.y.dtype)
+        percussive = librosa.istft(
+            stft_percussive, length=len(self.y), dtype=self.y.dtype
+        )
+        return harmonic, percussive
+
+
+def _tempo(analysis):
+    tempo, _ = analysis.beat_track
+    return float(np.atleast_1d(tempo)[0])
+
+
+def _tempo_fast(analysis):
+    tempo, _ = analysis.excerpt_tempos
+    return tempo
+
+
+def _tempo_confidence(analysis):
+    return _agreement(analysis, _tempo)
+
+
+def _tempo_confidence_fast(analysis):
+    return _agreement(analysis, _tempo_fast)
+
+
+def _agreement(analysis, tempo_extractor):
+    # fraction of the excerpts whose tempo agrees with the tempo of the
+    # stem, the one already known if any. excerpts without a reliable tempo
+    # never agree, so stems that are too short or silent get 0
+    tempo = analysis.values.get("tempo")
+    if tempo is None:
+        tempo = tempo_extractor(analysis)
+
+    _, excerpt_tempos = analysis.excerpt_tempos
+    agree = np.abs(excerpt_tempos - tempo) <= TEMPO_TOLERANCE * tempo
+    return round(float(np.mean(agree)), 4)
+
+
+def _first_beat(analysis):
+    # mixing only needs the first beat after the leading silence
+    _, beat_frames = analysis.beat_track
+    beat_times = librosa.frames_to_time(beat_frames, sr=analysis.sr)
+    return _first_beat_after(beat_times, analysis.trim[0])
+
+
+def _first_beat_fast(analysis):
+    # beats of the first excerpt, which starts after the leading silence,
+    # tracked at the tempo of the stem and reusing the onset envelope of the
+    # tempo estimation
+    start = int(analysis.trim[0] * analysis.sr) / analysis.sr
+
+    _, beat_frames = librosa.beat.beat_track(
+        onset_envelope=analysis.excerpt_onset_envelopes[0],
+        sr=analysis.sr,
+        bpm=_tempo_fast(analysis),
+    )
+    beat_times = librosa.frames_to_time(beat_frames, sr=analysis.sr) + start
+    return _first_beat_after(beat_times, analysis.trim[0])
+
+
+def _first_beat_after(beat_times, trim_start):
+    # first beat at or after `trim_start`, None if there's none
+    beat_times = beat_times[beat_times >= trim_start]
+
+    if len(beat_times) == 0:
+        return None
+
+    return round(float(beat_times[0]), 4)
+
+
+def _trim_start(analysis):
+    return analysis.trim[0]
+
+
+def _trim_end(analysis):
+    return analysis.trim[1]
+
+
+def _sound_class(analysis):
+    harmonic, percussive = analysis.hpss
+
+    harmonic_energy = np.sqrt(np.mean(np.square(harmonic)))
+    percussive_energy = np.sqrt(np.mean(np.square(percussive)))
+
+    return _classify(harmonic_energy, percussive_energy)
+
+
+def _sound_class_fast(analysis):
+    # HPSS of the magnitude of a few short excerpts, with a smaller FFT. the
+    # energy of each component is read from its spectrogram, so there's no
+    # inverse STFT either
+    spectrograms = [
+        np.abs(librosa.stft(excerpt, n_fft=FAST_N_FFT))
+        for excerpt in _excerpts(analysis, FAST_EXCERPTS, FAST_EXCERPT_DURATION)
+    ]
+    harmonic, percussive = librosa.decompose.hpss(np.concatenate(spectrograms, axis=1))
+
+    harmonic_energy = np.sqrt(np.sum(np.square(harmonic)))
+    percussive_energy = np.sqrt(np.sum(np.square(percussive)))
+
+    return _classify(harmonic_energy, percussive_energy)
+
+
+def _excerpts(analysis, n_excerpts, duration, min_duration=0.0):
+    # `n_excerpts` evenly spaced excerpts of the non-silent part of the stem.
+    # if it's shorter than the excerpts together, they're shortened, down to
+    # `min_duration`, and then overlap
+    start, end = (int(t * analysis.sr) for t in analysis.trim)
+    length = min(
+        int(duration * analysis.sr),
+        max((end - start) // n_excerpts, int(min_duration * analysis.sr)),
+        end - start,
+    )
+
+    starts = np.linspace(start, end - length, n_excerpts).astype(int)
+    return [analysis.y[s:s + length] for s in starts]
+
+
+def _classify(harmonic_energy, percussive_energy):
+    if harmonic_energy + percussive_energy == 0:
+        return "undetermined"
+
+    percent_difference = abs(harmonic_energy - percussive_energy) / (
+        (harmonic_energy + percussive_energy) / 2
+    )
+
+    threshold = 0.50  # 50% THRESHOLD (subject to change)
+
+    if percent_difference < threshold:
+        sound_class = "undetermined"
+    elif percussive_energy > harmonic_energy:
+        sound_class = "percussive"
+    else:
+        sound_class = "harmonic"
+
+    return sound_class
+
+
+# feature name -> function receiving an `Analysis` and returning the value.
+# new features only need to be registered here to be computed by `extract`
+EXTRACTORS = {
+    "tempo": _tempo,
+    "tempo_confidence": _tempo_confidence,
+    "first_beat": _first_beat,
+    "trim_start": _trim_start,
+    "trim_end": _trim_end,
+    "sound_class": _sound_class,
+}
+
+# faster, approximate extractors, selected with the `modes` of `extract`.
+# the extractors above are the "accurate" mode
+FAST_EXTRACTORS = {
+    "tempo": _tempo_fast,
+    "tempo_confidence": _tempo_confidence_fast,
+    "first_beat": _first_beat_fast,
+    "sound_class": _sound_class_fast,
+}
+MODES = ["accurate", "fast"]
+
+# feature name -> profiling stage its extractor is recorded under
+STAGES = {
+    "tempo": "tempo",
+    "tempo_confidence": "tempo",
+    "first_beat": "tempo",
+    "trim_start": "trim",
+    "trim_end": "trim",
+    "sound_class": "hpss",
+}
+
+
+def extract(stem_path, features=None, sr=22050, profiler=None, modes=None, known=None):
+    r"""
+    Decode a stem once and compute several features from it.
+
+    Parameters
+    ----------
+    stem_path : str
+        path to the audio stem file.
+    features : list[str] or None
+        features to compute (keys of ``EXTRACTORS``). if None, compute all
+        of them
+    sr : int
+        sampling rate used for the analysis
+    profiler : profiling.Profiler or None
+        if provided, record the decoding ("decode") and every extractor,
+        under its stage in ``STAGES``
+    modes : dict or None
+        mode of some features, e.g. ``{"sound_class": "fast"}``. "accurate"
+        (default) analyzes the whole stem, "fast" uses the extractor of
+        ``FAST_EXTRACTORS``, which analyzes a few short excerpts
+    known : dict or None
+        feature values that are already known, e.g. the tempo of the stems of
+        a dataset. ``tempo_confidence`` is measured against the known tempo
+
+    Returns
+    -------
+    values : dict
+        dictionary mapping each requested feature to its value
+    """
+    if features is None:
+        features = list(EXTRACTORS)
+
+    unknown = set(features).difference(EXTRACTORS)
+    if unknown:
+        raise ValueError(f"Unknown features: {sorted(unknown)}")
+
+    extractors = {name: _extractor(name, (modes or {}).get(name)) for name in features}
+
+    if len(features) == 0:
+        return {}
+
+    with profiling.stage(profiler, "decode") as record:
+        analysis = Analysis.from_file(stem_path, sr=sr)
+        analysis.values.update(known or {})
+        if profiler is not None:
+            record["bytes_read"] += os.path.getsize(stem_path)
+
+    values = {}
+    for name in features:
+        with profiling.stage(profiler, STAGES.get(name, name)):
+            values[name] = extractors[name](analysis)
+            analysis.values[name] = values[name]
+
+    return values
+
+
+def _extractor(name, mode=None):
+    if mode is None or mode == "accurate":
+        return EXTRACTORS[name]
+
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode}. Use one of {MODES}")
+
+    if name not in FAST_EXTRACTORS:
+        raise ValueError(f"Feature {name} has no {mode} mode")
+
+    return FAST_EXTRACTORS[name]
+
+
+def tempo(stem_path, sr=22050, mode="accurate", confidence=False):
     r"""
     Extracts the tempo from an audio stem file.
 
@@ -22,18 +382,30 @@ def tempo(stem_path, sr=22050):
     ----------
     stem_path : str
         path to the audio stem file.
+    mode : str
+        * accurate: beat tracking over the whole stem (default)
+        * fast: tempogram of a few excerpts of the stem. it only saves
+          time on stems longer than the excerpts together (30 seconds),
+          shorter stems are analyzed whole in both modes
+    confidence : bool
+        if True, also return the fraction of the excerpts of the stem whose
+        own tempo agrees with the estimated tempo. 0 if the stem is shorter
+        than the tempogram window or has no onsets
 
     Returns
     -------
     tempo : float
         The estimated tempo of the audio file.
+    tempo_confidence : float
+        only if `confidence` is True. between 0 and 1
     """
+    names = ["tempo", "tempo_confidence"] if confidence else ["tempo"]
+    values = extract(stem_path, names, sr=sr, modes={name: mode for name in names})
 
-    audio_file, sr = librosa.load(stem_path, sr=sr, mono=True)
-    tempo, _ = librosa.beat.beat_track(y=audio_file, sr=sr)
-    tempo = float(tempo)
+    if confidence:
+        return values["tempo"], values["tempo_confidence"]
 
-    return tempo
+    return values["tempo"]
 
 
 def tempo_bin(tempo):
@@ -51,7 +423,7 @@ def tempo_bin(tempo):
     return math.ceil(tempo / 5) * 5
 
 
-def sound_class(stem_path, sr=22050):
+def sound_class(stem_path, sr=22050, mode="accurate"):
     r"""
     Extracts the sound class (harmonic / percussive) from an audio stem file.
 
@@ -59,6 +431,11 @@ def sound_class(stem_path, sr=22050):
     ----------
     stem_path : str
         path to the audio stem file.
+    mode : str
+        * accurate: compare the harmonic and percussive components of the
+          HPSS of the whole stem (default)
+        * fast: same comparison, over the spectrogram of a few short
+          excerpts
 
     Returns
     -------
@@ -66,24 +443,6 @@ def sound_class(stem_path, sr=22050):
         The determined sound class of the audio file, or "undetermined"
         if difference between percussive / harmonic is not significant enough
     """
-
-    y, sr = librosa.load(stem_path, sr=sr, mono=True)
-    harmonic, percussive = librosa.effects.hpss(y)
-
-    harmonic_energy = np.sqrt(np.mean(np.square(harmonic)))
-    percussive_energy = np.sqrt(np.mean(np.square(percussive)))
-
-    percent_difference = abs(harmonic_energy - percussive_energy) / (
-        (harmonic_energy + percussive_energy) / 2
-    )
-
-    threshold = 0.50  # 50% THRESHOLD (subject to change)
-
-    if percent_difference < threshold:
-        sound_class = "undetermined"
-    elif percussive_energy > harmonic_energy:
-        sound_class = "percussive"
-    else:
-        sound_class = "harmonic"
-
-    return sound_class
+    return extract(stem_path, ["sound_class"], sr=sr, modes={"sound_class": mode})[
+        "sound_class"
+    ]
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. autosummary::
+   :toctree: generated/
+
+   Journal
+"""
+import sqlite3
+import time
+
+STATUSES = ["pending", "done", "failed"]
+
+
+class Journal:
+    r"""
+    SQLite file recording the preprocessing status of every stem.
+
+    A stem is "pending" until its metadata is written, then "done", or
+    "failed" with the error that stopped it. Every change is committed
+    right away, so a killed run can be resumed from the journal: stems that
+    are still pending were interrupted and have to be processed again.
+
+    Only the main process writes to the journal, worker processes just
+    return their results.
+
+    Parameters
+    ----------
+    path : str
+        journal file. created if it doesn't exist
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        # write-ahead log: each commit appends to the log instead of
+        # rewriting the database, which keeps per-stem commits cheap
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS stems ("
+            "stem_name TEXT PRIMARY KEY, "
+            "status TEXT NOT NULL, "
+            "error TEXT, "
+            "attempts INTEGER NOT NULL DEFAULT 0, "
+            "updated_at REAL NOT NULL)"
+        )
+        self._connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+    def close(self):
+        r"""
+        Close the journal file.
+        """
+        self._connection.close()
+
+    def add(self, stem_names, status="pending"):
+        r"""
+        Add stems to the journal. Stems already in it keep their status.
+
+        Parameters
+        ----------
+        stem_names : list[str]
+        status : str
+            status of the new stems
+        """
+        self._check_status(status)
+
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO stems (stem_name, status, updated_at) "
+                "VALUES (?, ?, ?)",
+                [(stem_name, status, time.time()) for stem_name in stem_names],
+            )
+
+    def update(self, stem_name, status, error=None):
+        r"""
+        Record the outcome of processing a stem.
+
+        Parameters
+        ----------
+        stem_name : str
+        status : str
+            "pending", "done" or "failed"
+        error : str or None
+            error of a failed stem
+        """
+        self._check_status(status)
+
+        with self._connection:
+            self._connection.execute(
+                "INSERT INTO stems (stem_name, status, error, attempts, updated_at) "
+                "VALUES (?, ?, ?, 1, ?) "
+                "ON CONFLICT (stem_name) DO UPDATE SET "
+                "status = excluded.status, error = excluded.error, "
+                "attempts = attempts + 1, updated_at = excluded.updated_at",
+                (stem_name, status, error, time.time()),
+            )
+
+    def status(self, stem_names=None):
+        r"""
+        Status of the stems in the journal.
+
+        Parameters
+        ----------
+        stem_names : list[str] or None
+            stems to look up. if None, all the stems in the journal
+
+        Returns
+        -------
+        status : dict
+            stem name -> status. stems that aren't in the journal are left out
+        """
+        rows = self._connection.execute("SELECT stem_name, status FROM stems")
+        status = dict(rows.fetchall())
+
+        if stem_names is None:
+            return status
+
+        return {name: status[name] for name in stem_names if name in status}
+
+    def failed(self):
+        r"""
+        Returns
+        -------
+        failed : list[tuple]
+            `(stem_name, error)` for every failed stem
+        """
+        rows = self._connection.execute(
+            "SELECT stem_name, error FROM stems WHERE status = 'failed' "
+            "ORDER BY stem_name"
+        )
+        return rows.fetchall()
+
+    def counts(self):
+        r"""
+        Returns
+        -------
+        counts : dict
+            number of stems with each status
+        """
+        rows = self._connection.execute(
+            "SELECT status, COUNT(*) FROM stems GROUP BY status"
+        )
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update(rows.fetchall())
+        return counts
+
+    def _check_status(self, status):
+        if status not in STATUSES:
+            raise ValueError(f"Unknown status {status}. Use one of {STATUSES}")
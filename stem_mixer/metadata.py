@@ -6,22 +6,56 @@
 
    dict_template
    feature_extraction
+   cache_stem
    check_file_number
    save_stem_dataframe
+   read_index
+   write_index
+   extract_stems
    brid_track_info
    musdb_track_info
 """
 import argparse
+import functools
 import glob
 import json
 import os
 
+import librosa
+import numpy as np
 import pandas as pd
-import tqdm
+import soundfile as sf
 
-from stem_mixer import features
+from stem_mixer import features, parallel, profiling
+from stem_mixer.journal import Journal
+from stem_mixer.sampler import is_missing
+from stem_mixer.store import STORE_FORMATS, MetadataStore
+from stem_mixer.writers import atomic_write
 
 DEFAULT_SR = 44100
+# sampling rate used for feature extraction and mixing
+MIX_SR = 22050
+# extensions supported by `read_index` and `write_index`
+INDEX_FORMATS = [".csv", ".npz", ".parquet", ".feather"] + STORE_FORMATS
+# formats that need the optional pyarrow dependency
+ARROW_FORMATS = [".parquet", ".feather"]
+# features computed by `feature_extraction` when they're not provided.
+# the time of the first beat after the leading silence (in seconds) and the
+# leading/trailing silence boundaries let the mixing step align stems
+# without running beat tracking again.
+# tempo_confidence is the fraction of excerpts of the stem whose tempo
+# agrees with the stem tempo (given or estimated), low values flag stems
+# worth re-analyzing
+FEATURES = [
+    "tempo",
+    "tempo_confidence",
+    "sound_class",
+    "first_beat",
+    "trim_start",
+    "trim_end",
+]
+# stems inserted at once in a `store.MetadataStore` during preprocessing
+STORE_BATCH_SIZE = 256
 BRID_INDEX = "brid_index.txt"
 MUSDB_INDEX = "musdb_index.txt"
 
@@ -57,7 +91,59 @@ def dict_template(
     return metadata
 
 
-def feature_extraction(data_home, stem_id, track_metadata=None, overwrite=False):
+def cache_stem(stem_path, cache_dir, sr=MIX_SR):
+    r"""
+    Convert a stem to mono float32 at `sr` and save it inside `cache_dir`.
+
+    Feature extraction and mixing read the converted copy, so each stem is
+    decoded and resampled only once.
+
+    Parameters
+    ----------
+    stem_path : str
+        path to the original stem
+    cache_dir : str
+        folder where converted stems are stored
+    sr : int
+        sampling rate of the converted stem
+
+    Returns
+    -------
+    cached_path : str
+        absolute path to the converted stem
+    """
+    cached_path = os.path.abspath(
+        os.path.join(cache_dir, os.path.basename(stem_path))
+    )
+
+    if cached_path == os.path.abspath(stem_path):
+        raise ValueError("cache_dir must be different from the stems folder")
+
+    if (
+        os.path.exists(cached_path)
+        and os.path.getmtime(cached_path) >= os.path.getmtime(stem_path)
+    ):
+        return cached_path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    audio, _ = librosa.load(stem_path, sr=sr, mono=True)
+
+    with atomic_write(cached_path) as tmp_path:
+        sf.write(tmp_path, audio, sr, subtype="FLOAT", format="WAV")
+
+    return cached_path
+
+
+def feature_extraction(
+    data_home,
+    stem_id,
+    track_metadata=None,
+    overwrite=False,
+    cache_dir=None,
+    profiler=None,
+    modes=None,
+    write_json=True,
+):
     r"""
     Takes file path to a stem, calculate features and save the metadata as JSON.
 
@@ -71,10 +157,24 @@ def feature_extraction(data_home, stem_id, track_metadata=None, overwrite=False)
         dictionary with pre-computed metadata
     overwrite: boolean
         if True, overwrite a JSON file that already exists
+    cache_dir: str or None
+        if provided, convert the stem with `cache_stem`, extract the features
+        from the converted copy and save its path as `cached_path`
+    profiler: profiling.Profiler or None
+        if provided, record the stages of the extraction, see
+        `features.extract`, plus the stem conversion ("cache") and the
+        JSON writing ("write")
+    modes: dict or None
+        mode of some features, e.g. ``{"sound_class": "fast"}``, see
+        `features.extract`
+    write_json: boolean
+        if False, the features are always computed and only returned, e.g.
+        to be saved in a `store.MetadataStore`
 
     Returns
     -------
-    None
+    metadata: dict or None
+        metadata of the stem, or None if its JSON file already existed
     """
 
     stem_path = os.path.join(data_home, stem_id)
@@ -83,21 +183,249 @@ def feature_extraction(data_home, stem_id, track_metadata=None, overwrite=False)
     if track_metadata is None:
         track_metadata = dict_template()
 
-    if not os.path.exists(json_file_path) or overwrite:
+    if not write_json or not os.path.exists(json_file_path) or overwrite:
         metadata = track_metadata.copy()
 
-        if metadata["tempo"] is None:
-            metadata["tempo"] = features.tempo(stem_path)
-
-        if metadata["sound_class"] is None:
-            metadata["sound_class"] = features.sound_class(stem_path)
+        if cache_dir is not None:
+            with profiling.stage(profiler, "cache"):
+                metadata["cached_path"] = cache_stem(stem_path, cache_dir)
+            stem_path = metadata["cached_path"]
+
+        # decode the stem only once for all the missing features
+        missing = [f for f in FEATURES if metadata.get(f) is None]
+        known = {f: metadata[f] for f in FEATURES if f not in missing}
+        metadata.update(
+            features.extract(
+                stem_path, missing, sr=MIX_SR, profiler=profiler, modes=modes,
+                known=known,
+            )
+        )
 
         metadata["tempo_bin"] = features.tempo_bin(metadata["tempo"])
 
-        with open(json_file_path, "w") as json_file:
+        if write_json:
+            with profiling.stage(profiler, "write") as record:
+                _write_json(json_file_path, metadata)
+                record["bytes_written"] += os.path.getsize(json_file_path)
+
+        return metadata
+
+    elif cache_dir is not None:
+        # stem already processed, but it might not have a converted copy yet
+        with open(json_file_path, "r") as json_file:
+            metadata = json.load(json_file)
+
+        cached_path = metadata.get("cached_path")
+        if cached_path is None or not os.path.exists(cached_path):
+            metadata["cached_path"] = cache_stem(stem_path, cache_dir)
+            _write_json(json_file_path, metadata)
+
+    return None
+
+
+def _write_json(json_file_path, metadata):
+    with atomic_write(json_file_path) as tmp_path:
+        with open(tmp_path, "w") as json_file:
             json.dump(metadata, json_file, indent=4)
 
-    return
+
+def _is_valid_json(json_file_path):
+    try:
+        with open(json_file_path, "r") as json_file:
+            json.load(json_file)
+    except (OSError, ValueError):
+        return False
+
+    return True
+
+
+def _extract_job(
+    job, cache_dir=None, profile=False, hook=None, modes=None, write_json=True
+):
+    data_home, stem_id, track_metadata = job
+
+    # each job records its own stages, which are merged by `extract_stems`
+    profiler = profiling.Profiler(hook=hook) if profile else None
+    metadata = feature_extraction(
+        data_home,
+        stem_id,
+        track_metadata=track_metadata,
+        cache_dir=cache_dir,
+        profiler=profiler,
+        modes=modes,
+        write_json=write_json,
+    )
+
+    return (profiler.records if profile else None), metadata
+
+
+def extract_stems(
+    jobs,
+    workers=1,
+    description=None,
+    cache_dir=None,
+    profiler=None,
+    modes=None,
+    journal=None,
+    retry_failed=False,
+    store=None,
+):
+    r"""
+    Run `feature_extraction` for several stems, optionally over a process pool.
+
+    A stem that fails (e.g. a corrupt file) is reported and skipped, the
+    remaining stems are still processed.
+
+    With a `journal`, stems that are already done are skipped and the
+    outcome of every stem is recorded as soon as it's known. Stems that are
+    new to the journal are done if they have a valid JSON file already.
+    Stems that are still pending were interrupted, so their JSON file is
+    discarded and they're processed again.
+
+    With a `store`, no JSON file is written. The metadata computed by the
+    workers is inserted in the store in batches of `STORE_BATCH_SIZE`
+    stems, one transaction per batch, and stems already in the store are
+    skipped.
+
+    Parameters
+    ----------
+    jobs : list[tuple]
+        `(data_home, stem_id, track_metadata)` for every stem
+    workers : int
+        number of worker processes. if 1, run in the current process
+    description : str or None
+        description of the progress bar
+    cache_dir : str or None
+        folder for stems converted with `cache_stem`
+    profiler : profiling.Profiler or None
+        if provided, the stages of every stem are added to it
+    modes : dict or None
+        mode of some features, see `features.extract`
+    journal : journal.Journal or None
+        journal of the preprocessing status of the stems
+    retry_failed : bool
+        if True, process again the stems that failed in a previous run.
+        otherwise they're skipped
+    store : store.MetadataStore or None
+        store where the metadata is saved instead of JSON files
+
+    Returns
+    -------
+    failed : list[tuple]
+        `(stem_id, error)` for every stem that could not be processed
+    """
+    if journal is not None:
+        jobs = _resume(jobs, journal, retry_failed, cache_dir, store)
+    elif store is not None:
+        jobs = [job for job in jobs if job[1] not in store]
+
+    results = parallel.imap(
+        functools.partial(
+            _extract_job,
+            cache_dir=cache_dir,
+            profile=profiler is not None,
+            hook=getattr(profiler, "hook", None),
+            modes=modes,
+            write_json=store is None,
+        ),
+        jobs,
+        workers=workers,
+        description=description,
+    )
+
+    failed = []
+    # stems computed but not inserted in the store yet
+    pending = []
+
+    # `results` goes first: zip stops at the first exhausted iterator, and the
+    # generator has to run to its end to close the pool and the progress bar
+    for (result, error), (_, stem_id, _) in zip(results, jobs):
+        records, metadata = result if error is None else (None, None)
+
+        if profiler is not None:
+            profiler.extend(records or [])
+
+        if error is not None:
+            failed.append((stem_id, error))
+            if journal is not None:
+                journal.update(stem_id, "failed", error)
+        elif store is not None:
+            pending.append(metadata)
+            if len(pending) >= STORE_BATCH_SIZE:
+                _flush(store, pending, journal)
+        elif journal is not None:
+            journal.update(stem_id, "done")
+
+    if store is not None:
+        _flush(store, pending, journal)
+
+    return failed
+
+
+def _flush(store, pending, journal=None):
+    # stems are marked as done only once they're committed to the store
+    store.put_many(pending)
+
+    if journal is not None:
+        for metadata in pending:
+            journal.update(metadata["stem_name"], "done")
+
+    pending.clear()
+
+
+def _resume(jobs, journal, retry_failed=False, cache_dir=None, store=None):
+    # jobs left to run according to the journal
+    stem_ids = [stem_id for _, stem_id, _ in jobs]
+    status = journal.status(stem_ids)
+
+    # stems processed before the journal existed, maybe by a version that
+    # didn't write JSON files atomically
+    new = [(data_home, stem_id) for data_home, stem_id, _ in jobs if stem_id not in status]
+    done = [
+        stem_id for data_home, stem_id in new
+        if _is_saved(data_home, stem_id, store, validate=True)
+    ]
+    journal.add(done, status="done")
+    journal.add([stem_id for _, stem_id in new])
+    status = journal.status(stem_ids)
+
+    remaining = []
+    for data_home, stem_id, track_metadata in jobs:
+        # the journal doesn't know where the metadata was saved. a stem done
+        # with another backend, e.g. JSON files before switching to a
+        # store, has to be processed again
+        if status[stem_id] == "done" and _is_saved(data_home, stem_id, store):
+            # a new cache_dir still needs a converted copy of done stems
+            if cache_dir is not None and store is None:
+                remaining.append((data_home, stem_id, track_metadata))
+            continue
+
+        if status[stem_id] == "failed" and not retry_failed:
+            continue
+
+        # the JSON of an interrupted stem can't be trusted. stems in a
+        # store are replaced when they're inserted again
+        json_file_path = _json_path(data_home, stem_id)
+        if store is None and os.path.exists(json_file_path):
+            os.remove(json_file_path)
+
+        remaining.append((data_home, stem_id, track_metadata))
+
+    return remaining
+
+
+def _is_saved(data_home, stem_id, store=None, validate=False):
+    # whether the metadata of a stem is in the store, or in a JSON file.
+    # `_write_json` is atomic, so only JSON files it didn't write need to be
+    # parsed
+    if store is not None:
+        return stem_id in store
+
+    json_file_path = _json_path(data_home, stem_id)
+    if validate:
+        return _is_valid_json(json_file_path)
+
+    return os.path.exists(json_file_path)
 
 
 def check_file_number(json_files, wav_files):
@@ -114,22 +442,260 @@ def check_file_number(json_files, wav_files):
     return
 
 
+def _json_path(data_home, stem_name):
+    return os.path.splitext(os.path.join(data_home, stem_name))[0] + ".json"
+
+
 def save_stem_dataframe(data_home, index_file="index.csv"):
-    json_files = glob.glob(os.path.join(data_home, "*.json"))
-    wav_files = glob.glob(os.path.join(data_home, "*.wav"))
+    r"""
+    Gather the JSON metadata of all stems in `data_home` into an index file.
+
+    The index is updated incrementally: it stores the modification time and
+    size of every JSON file, so only new or modified JSON files are parsed
+    and entries whose JSON file was removed are dropped. The index is
+    written to a temporary file first and then renamed, so readers never
+    see a partially written index.
+
+    Parameters
+    ----------
+    data_home : str
+        path to folder with stems and their JSON metadata
+    index_file : str
+        name of the index file inside `data_home`
+
+    Returns
+    -------
+    df : pd.DataFrame
+        dataframe with stems information
+    """
+    index_path = os.path.join(data_home, index_file)
+
+    json_stats = {}
+    for file in glob.glob(os.path.join(data_home, "*.json")):
+        stat = os.stat(file)
+        json_stats[os.path.abspath(file)] = (stat.st_mtime_ns, stat.st_size)
+
+    # reuse every entry whose JSON file didn't change since the last run
+    previous = []
+    if os.path.exists(index_path):
+        index = read_index(index_path)
+
+        if {"json_mtime_ns", "json_size"}.issubset(index.columns):
+            previous = index.to_dict("records")
 
     data = []
-    # check_file_number(json_files, wav_files)
-    for file in json_files:
+    for row in previous:
+        if not isinstance(row["stem_name"], str):
+            continue
+
+        json_file = os.path.abspath(_json_path(data_home, row["stem_name"]))
+        if json_stats.get(json_file) == (row["json_mtime_ns"], row["json_size"]):
+            data.append(row)
+            json_stats.pop(json_file)
+
+    # new or modified stems
+    for file, (mtime_ns, size) in json_stats.items():
         with open(file, "r") as f:
-            data.append(json.load(f))  # extracting json data
+            row = json.load(f)  # extracting json data
+
+        row["json_mtime_ns"] = mtime_ns
+        row["json_size"] = size
+        data.append(row)
 
     df = pd.DataFrame.from_dict(data)
-    df.to_csv(os.path.join(data_home, index_file), index=False)
+    if len(df) > 0:
+        df = df.sort_values("stem_name", ignore_index=True)
+
+    write_index(df, index_path)
+
+    return df
+
+
+def _index_format(index_path):
+    extension = os.path.splitext(index_path)[1].lower()
+
+    if extension not in INDEX_FORMATS:
+        raise ValueError(
+            f"Unsupported index format {extension}. Use one of {INDEX_FORMATS}"
+        )
+
+    if extension in ARROW_FORMATS:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError(
+                f"{extension} indexes require pyarrow. Install it with "
+                "`pip install stem_mixer[index]`, or use .csv or .npz"
+            ) from None
+
+    return extension
+
+
+def write_index(df, index_path):
+    r"""
+    Write the stem index. The format is chosen by the file extension:
+
+    * .csv: plain text, readable anywhere (default)
+    * .npz: typed NumPy columns, with text columns stored as categorical
+      codes. no extra dependencies
+    * .parquet / .feather: typed columnar formats, require ``pyarrow``
+      (``pip install stem_mixer[index]``)
+    * .sqlite / .db: a `store.MetadataStore`, which `mix.select_stems` can
+      query without loading the whole index
+
+    The index is written to a temporary file first and then renamed, so
+    readers never see a partially written index.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        dataframe with stems information
+    index_path : str
+        path to the index file
+
+    Returns
+    -------
+    None
+    """
+    extension = _index_format(index_path)
+
+    with atomic_write(index_path) as tmp_path:
+        if extension == ".csv":
+            df.to_csv(tmp_path, index=False)
+        elif extension == ".npz":
+            with open(tmp_path, "wb") as f:
+                np.savez(f, **_to_arrays(df))
+        elif extension == ".parquet":
+            df.to_parquet(tmp_path, index=False)
+        elif extension == ".feather":
+            df.reset_index(drop=True).to_feather(tmp_path)
+        elif extension in STORE_FORMATS:
+            with MetadataStore(tmp_path) as store:
+                store.put_many(df.to_dict("records"))
+
+    return
+
+
+def read_index(index_path):
+    r"""
+    Read a stem index written by `write_index`.
+
+    Columns holding lists are returned as python lists and missing text
+    values as None, whatever the format.
+
+    Parameters
+    ----------
+    index_path : str
+        path to the index file
+
+    Returns
+    -------
+    df : pd.DataFrame
+        dataframe with stems information
+    """
+    extension = _index_format(index_path)
+
+    if extension == ".csv":
+        df = pd.read_csv(index_path)
+        # lists are written as strings to the csv
+        for column in df.columns:
+            values = df[column].dropna()
+            if len(values) > 0 and all(
+                isinstance(v, str) and v.startswith("[") for v in values
+            ):
+                df[column] = [
+                    json.loads(v) if isinstance(v, str) else None for v in df[column]
+                ]
+    elif extension == ".npz":
+        with np.load(index_path, allow_pickle=False) as arrays:
+            df = _from_arrays(arrays)
+    elif extension in STORE_FORMATS:
+        with MetadataStore(index_path) as store:
+            df = store.to_dataframe()
+    else:
+        if extension == ".parquet":
+            df = pd.read_parquet(index_path)
+        else:
+            df = pd.read_feather(index_path)
+
+        for column in df.columns[df.dtypes == object]:
+            df[column] = df[column].map(
+                lambda v: v.tolist() if isinstance(v, np.ndarray) else v
+            )
 
     return df
 
 
+def _to_arrays(df):
+    # every column is stored with a kind:
+    # * "numeric": the array itself
+    # * "categorical": int32 codes (-1 for None) and the unique strings
+    # * "list": flattened float values, offsets and a validity mask
+    arrays = {}
+    kinds = []
+
+    for column in df.columns:
+        values = df[column]
+        valid = np.array([not is_missing(v) for v in values], dtype=bool)
+
+        if pd.api.types.is_numeric_dtype(values):
+            kinds.append("numeric")
+            arrays[column] = values.to_numpy()
+        elif all(isinstance(v, str) for v in values[valid]):
+            kinds.append("categorical")
+            categories, codes = np.unique(
+                values[valid].to_numpy(dtype=str), return_inverse=True
+            )
+            all_codes = np.full(len(values), -1, dtype=np.int32)
+            all_codes[valid] = codes
+            arrays[f"{column}.codes"] = all_codes
+            arrays[f"{column}.categories"] = categories.astype(str)
+        elif all(isinstance(v, list) for v in values[valid]):
+            kinds.append("list")
+            lists = [v if is_valid else [] for v, is_valid in zip(values, valid)]
+            arrays[f"{column}.values"] = np.array(
+                [x for v in lists for x in v], dtype=np.float64
+            )
+            arrays[f"{column}.offsets"] = np.concatenate(
+                [[0], np.cumsum([len(v) for v in lists])]
+            ).astype(np.int64)
+            arrays[f"{column}.valid"] = valid
+        else:
+            raise TypeError(f"Column {column} can't be written as .npz")
+
+    arrays["__columns__"] = np.array(list(df.columns), dtype=str)
+    arrays["__kinds__"] = np.array(kinds, dtype=str)
+
+    return arrays
+
+
+def _from_arrays(arrays):
+    data = {}
+
+    for column, kind in zip(arrays["__columns__"], arrays["__kinds__"]):
+        column = str(column)
+
+        if kind == "numeric":
+            data[column] = arrays[column]
+        elif kind == "categorical":
+            codes = arrays[f"{column}.codes"]
+            categories = np.append(
+                arrays[f"{column}.categories"].astype(object), None
+            )
+            # code -1 picks the trailing None
+            data[column] = categories[codes]
+        else:
+            values = arrays[f"{column}.values"].tolist()
+            offsets = arrays[f"{column}.offsets"]
+            valid = arrays[f"{column}.valid"]
+            data[column] = [
+                values[start:end] if is_valid else None
+                for start, end, is_valid in zip(offsets[:-1], offsets[1:], valid)
+            ]
+
+    return pd.DataFrame(data)
+
+
 def brid_track_info(data_home, tid):
     r"""
     BRID DATASET PRE-PROCESSING
@@ -194,9 +760,42 @@ def brid_track_info(data_home, tid):
     return track_metadata
 
 
-def musdb(data_home):
-    """
+def musdb(
+    data_home,
+    workers=1,
+    cache_dir=None,
+    profiler=None,
+    modes=None,
+    journal=None,
+    retry_failed=False,
+    store=None,
+):
+    r"""
     create metadata for MUSDB tracks present in `data_home`.
+
+    Parameters
+    ----------
+    data_home : str
+        path to folder with stems
+    workers : int
+        number of worker processes
+    cache_dir : str or None
+        folder for stems converted with `cache_stem`
+    profiler : profiling.Profiler or None
+        if provided, the stages of every stem are added to it
+    modes : dict or None
+        mode of some features, see `features.extract`
+    journal : journal.Journal or None
+        journal of the preprocessing status of the stems, see `extract_stems`
+    retry_failed : bool
+        if True, process again the stems that failed in a previous run
+    store : store.MetadataStore or None
+        store where the metadata is saved instead of JSON files
+
+    Returns
+    -------
+    failed : list[tuple]
+        `(stem_name, error)` for every stem that could not be processed
     """
     musdb_stems = stems_from_file(MUSDB_INDEX)
 
@@ -208,14 +807,22 @@ def musdb(data_home):
     # process only what we have inside the stems folder
     available_stems = all_stems.intersection(musdb_stems)
 
-    pbar = tqdm.tqdm(available_stems)
-    pbar.set_description("Processing MUSDB stems")
-
-    for tid in pbar:
-        track_metadata = musdb_track_info(data_home, tid)
-        feature_extraction(data_home, tid, track_metadata)
+    jobs = [
+        (data_home, tid, musdb_track_info(data_home, tid))
+        for tid in sorted(available_stems)
+    ]
 
-    return
+    return extract_stems(
+        jobs,
+        workers=workers,
+        description="Processing MUSDB stems",
+        cache_dir=cache_dir,
+        profiler=profiler,
+        modes=modes,
+        journal=journal,
+        retry_failed=retry_failed,
+        store=store,
+    )
 
 
 def musdb_track_info(data_home, tid):
@@ -267,9 +874,42 @@ def musdb_track_info(data_home, tid):
     return track_metadata
 
 
-def brid(data_home):
+def brid(
+    data_home,
+    workers=1,
+    cache_dir=None,
+    profiler=None,
+    modes=None,
+    journal=None,
+    retry_failed=False,
+    store=None,
+):
     r"""
     create metadata for BRID tracks present in `data_home`.
+
+    Parameters
+    ----------
+    data_home : str
+        path to folder with stems
+    workers : int
+        number of worker processes
+    cache_dir : str or None
+        folder for stems converted with `cache_stem`
+    profiler : profiling.Profiler or None
+        if provided, the stages of every stem are added to it
+    modes : dict or None
+        mode of some features, see `features.extract`
+    journal : journal.Journal or None
+        journal of the preprocessing status of the stems, see `extract_stems`
+    retry_failed : bool
+        if True, process again the stems that failed in a previous run
+    store : store.MetadataStore or None
+        store where the metadata is saved instead of JSON files
+
+    Returns
+    -------
+    failed : list[tuple]
+        `(stem_name, error)` for every stem that could not be processed
     """
     brid_stems = stems_from_file(BRID_INDEX)
 
@@ -281,14 +921,22 @@ def brid(data_home):
     # process only what we have inside the stems folder
     available_stems = all_stems.intersection(brid_stems)
 
-    pbar = tqdm.tqdm(available_stems)
-    pbar.set_description("Processing BRID stems")
-
-    for tid in pbar:
-        track_metadata = brid_track_info(data_home, tid)
-        feature_extraction(data_home, tid, track_metadata)
+    jobs = [
+        (data_home, tid, brid_track_info(data_home, tid))
+        for tid in sorted(available_stems)
+    ]
 
-    return
+    return extract_stems(
+        jobs,
+        workers=workers,
+        description="Processing BRID stems",
+        cache_dir=cache_dir,
+        profiler=profiler,
+        modes=modes,
+        journal=journal,
+        retry_failed=retry_failed,
+        store=store,
+    )
 
 
 def stems_from_file(filename):
@@ -304,7 +952,19 @@ def stems_from_file(filename):
     return stems
 
 
-def process(data_home, datasets=None):
+def process(
+    data_home,
+    datasets=None,
+    workers=1,
+    cache_dir=None,
+    index_file="index.csv",
+    profile=None,
+    profile_hook=None,
+    sound_class_mode="accurate",
+    tempo_mode="accurate",
+    journal_file="journal.sqlite",
+    retry_failed=False,
+):
     r"""
     generate metadata for all stems in the folder
 
@@ -317,21 +977,82 @@ def process(data_home, datasets=None):
         using the specific information we know, such as instruments and
         tempo.
         supported datasets are ["brid", "musdb"]
+    workers : int
+        number of worker processes used for feature extraction
+    cache_dir : str or None
+        if provided, every stem is converted once to mono float32 at
+        `MIX_SR` inside this folder, and both feature extraction and mixing
+        read the converted copy
+    index_file : str
+        name of the index file. its extension defines the format, see
+        `write_index`. with .sqlite or .db, the metadata of every stem is
+        saved directly to a `store.MetadataStore` instead of JSON files
+    profile : str or None
+        if provided, record the time spent in every stage (decode, tempo,
+        hpss, write, ...) and save a summary to this path (.json or .csv),
+        see `profiling.Profiler`
+    profile_hook : callable or None
+        hook for external profilers, see `profiling.Profiler`
+    sound_class_mode : str
+        * accurate: HPSS of the whole stem (default)
+        * fast: HPSS of the spectrogram of a few short excerpts, much
+          faster on long stems
+        see `features.sound_class`
+    tempo_mode : str
+        * accurate: beat tracking over the whole stem (default)
+        * fast: tempo from the tempogram of a few excerpts, and beats of
+          the first excerpt only, which is all mixing needs
+        see `features.tempo`
+    journal_file : str or None
+        name of the SQLite journal inside `data_home` that records the
+        status of every stem, so a killed run resumes where it stopped and
+        failed stems are remembered. if None, stems with a JSON file are
+        skipped and failures are only printed
+    retry_failed : bool
+        if True, process again the stems that failed in a previous run
 
     Returns
     -------
     None
     """
+    modes = {
+        "sound_class": sound_class_mode,
+        "tempo": tempo_mode,
+        "tempo_confidence": tempo_mode,
+        "first_beat": tempo_mode,
+    }
+
+    profiler = None
+    if profile is not None:
+        profiler = profiling.Profiler(hook=profile_hook)
+
+    journal = None
+    if journal_file is not None:
+        journal = Journal(os.path.join(data_home, journal_file))
+
+    store = None
+    if _index_format(index_file) in STORE_FORMATS:
+        store = MetadataStore(os.path.join(data_home, index_file))
+
     # create a set with all stems (basename only)
     available_stems = set(
         [os.path.basename(tid) for tid in glob.glob(os.path.join(data_home, "*.wav"))]
     )
 
-    all_stems = available_stems.copy()
+    failed = []
 
     if datasets is not None and "brid" in datasets:
         # process tracks
-        brid(data_home)
+        failed += brid(
+            data_home,
+            workers=workers,
+            cache_dir=cache_dir,
+            profiler=profiler,
+            modes=modes,
+            journal=journal,
+            retry_failed=retry_failed,
+            store=store,
+        )
         # update stems list so we don't reprocess a brid stem
         brid_stems = set(stems_from_file(BRID_INDEX))
         available_stems = available_stems.difference(brid_stems)
@@ -340,18 +1061,57 @@ def process(data_home, datasets=None):
         # process tracks
         musdb_stems = set(stems_from_file(MUSDB_INDEX))
         # update stems list so we don't reprocess a musdb stem
-        musdb(data_home)
+        failed += musdb(
+            data_home,
+            workers=workers,
+            cache_dir=cache_dir,
+            profiler=profiler,
+            modes=modes,
+            journal=journal,
+            retry_failed=retry_failed,
+            store=store,
+        )
         available_stems = available_stems.difference(musdb_stems)
 
     # process remaining stems
-    pbar = tqdm.tqdm(available_stems)
-    pbar.set_description("Processing remaining stems")
-    for tid in pbar:
-        track_metadata = dict_template(data_home, tid)
-        feature_extraction(data_home, tid, track_metadata=track_metadata)
-
-    print("Writing stems dataframe")
-    save_stem_dataframe(data_home, index_file="index.csv")
+    jobs = [
+        (data_home, tid, dict_template(data_home, tid))
+        for tid in sorted(available_stems)
+    ]
+    failed += extract_stems(
+        jobs,
+        workers=workers,
+        description="Processing remaining stems",
+        cache_dir=cache_dir,
+        profiler=profiler,
+        modes=modes,
+        journal=journal,
+        retry_failed=retry_failed,
+        store=store,
+    )
+
+    if journal is not None:
+        # also report stems that failed in previous runs
+        failed = journal.failed()
+        journal.close()
+
+    if len(failed) > 0:
+        print(f"{len(failed)} stems could not be processed:")
+        for tid, error in failed:
+            print(f"  {tid}: {error.strip().splitlines()[-1]}")
+
+    if store is not None:
+        print(f"Metadata of {len(store)} stems saved to {index_file}")
+        store.close()
+    else:
+        print("Writing stems dataframe")
+        save_stem_dataframe(data_home, index_file=index_file)
+
+    if profiler is not None:
+        print("Time spent per stage:")
+        profiler.report()
+        profiler.save(profile)
+
     return
 
 
@@ -370,9 +1130,76 @@ if __name__ == "__main__":
         help="supported datasets: BRID (enter 'brid') and MUSDB (enter 'musdb')",
     )
 
+    parser.add_argument(
+        "--workers",
+        required=False,
+        default=1,
+        type=int,
+        help="number of worker processes used for feature extraction",
+    )
+
+    parser.add_argument(
+        "--cache_dir",
+        required=False,
+        default=None,
+        help="folder where stems are stored after being resampled for mixing",
+    )
+
+    parser.add_argument(
+        "--index_file",
+        required=False,
+        default="index.csv",
+        help="name of the index file. supported formats: .csv, .npz, .parquet, "
+        ".feather, and .sqlite or .db to save metadata directly to a SQLite store",
+    )
+
+    parser.add_argument(
+        "--profile",
+        required=False,
+        default=None,
+        help="save the time spent in each stage to this file (.json or .csv)",
+    )
+
+    parser.add_argument(
+        "--sound_class_mode",
+        required=False,
+        default="accurate",
+        choices=features.MODES,
+        help="accurate runs HPSS on the whole stem, fast on a few short excerpts",
+    )
+    parser.add_argument(
+        "--tempo_mode",
+        required=False,
+        default="accurate",
+        choices=features.MODES,
+        help="accurate tracks beats over the whole stem, fast uses a few excerpts",
+    )
+    parser.add_argument(
+        "--journal_file",
+        required=False,
+        default="journal.sqlite",
+        help="SQLite file inside data_home recording the status of every stem",
+    )
+    parser.add_argument(
+        "--retry_failed",
+        action="store_true",
+        help="process again the stems that failed in a previous run",
+    )
+
     args = parser.parse_args()
 
     if args.datasets is not None:
         args.datasets = args.datasets.split(",")
 
-    process(args.data_home, args.datasets)
+    process(
+        args.data_home,
+        args.datasets,
+        workers=args.workers,
+        cache_dir=args.cache_dir,
+        index_file=args.index_file,
+        profile=args.profile,
+        sound_class_mode=args.sound_class_mode,
+        tempo_mode=args.tempo_mode,
+        journal_file=args.journal_file,
+        retry_failed=args.retry_failed,
+    )
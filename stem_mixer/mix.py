@@ -4,29 +4,87 @@
 .. autosummary::
    :toctree: generated/
 
+   load_index
+   load_sampler
    select_stems
    possible_tempo_bins
+   load_audio
+   stretch_audio
    time_stretch
+   first_beat_time
    align_first_beat
    mix
+   mixture_rng
+   generate_mixture
    generate_mixtures
    save_mixture
 """
 import argparse
+import functools
+import math
 import os
 import json
-import random
 import uuid
 
 import librosa
 import numpy as np
-import pandas as pd
 import soundfile as sf
-import tqdm
+
+from stem_mixer import batch, metadata, parallel, profiling
+from stem_mixer.cache import AudioCache
+from stem_mixer.sampler import StemSampler, eligible_tempo_bins, is_missing, stem_counts
+from stem_mixer.store import STORE_FORMATS, StoreSampler
+from stem_mixer.writers import MixtureWriter, ShardWriter, atomic_write, stem_metadata
+
+
+def load_index(data_home, index_file="index.csv"):
+    r"""
+    Load the index with pre-computed features of the stems
+
+    Parameters
+    ----------
+    data_home : str
+        path to stems
+    index_file : str
+        name of the index file inside `data_home`. the format is chosen by
+        the extension, see `metadata.write_index`
+
+    Returns
+    -------
+    index : pd.DataFrame
+        dataframe with stems information
+    """
+    return metadata.read_index(os.path.join(data_home, index_file))
+
+
+def load_sampler(data_home, index_file="index.csv"):
+    r"""
+    Build the sampler of the stems of an index.
+
+    A SQLite index (.sqlite or .db) is queried directly by a
+    `store.StoreSampler`. Other formats are loaded with `load_index` and
+    bucketed in memory by a `sampler.StemSampler`.
+
+    Parameters
+    ----------
+    data_home : str
+        path to stems
+    index_file : str
+        name of the index file inside `data_home`
+
+    Returns
+    -------
+    sampler : StemSampler or StoreSampler
+    """
+    if os.path.splitext(index_file)[1].lower() in STORE_FORMATS:
+        return StoreSampler(os.path.join(data_home, index_file))
+
+    return StemSampler(load_index(data_home, index_file))
 
 
 def select_stems(
-    n_percussive, n_harmonic, data_home, index_file, base_stem=None, **kwargs
+    n_percussive, n_harmonic, data_home, index_file, base_stem=None, index=None,
+    rng=None, sampler=None, **kwargs
 ):
     """
     Select stems from a given index
@@ -34,6 +92,14 @@ def select_stems(
     Parameters
     -----------
     base_stem : str
+    index : pd.DataFrame or None
+        index already loaded with `load_index`. if None, read `index_file`
+        from `data_home`
+    rng : np.random.Generator, int or None
+        random generator (or seed) used to draw the stems
+    sampler : StemSampler, StoreSampler or None
+        sampler built once from the index. if None, build one from `index`,
+        or with `load_sampler` if `index` is None too
     \*\*kwargs : dict additional arguments
 
     Returns
@@ -45,61 +111,14 @@ def select_stems(
     base_tempo : int
         tempo_bin from the base stem
     """
-    index = pd.read_csv(os.path.join(data_home, index_file))
-    tempo_choices = possible_tempo_bins(index, n_harmonic, n_percussive)
-
-    # print(tempo_choices)
-    tempo = random.choice(tempo_choices)
-    # print(tempo_choices, tempo)
-
-    # base_stem for now is random if not provided
-    if base_stem is not None:
-        base_stem = index[index["stem_name"] == base_stem]
-    elif n_percussive > 0:
-        n_percussive -= 1
-        base_stem = index[
-            (index["sound_class"] == "percussive") & (index["tempo_bin"] == tempo)
-        ].sample()
-    elif n_harmonic > 0:
-        n_harmonic -= 1
-        base_stem = index[
-            (index["sound_class"] == "harmonic") & (index["tempo_bin"] == tempo)
-        ].sample()
-
-    # remove base_stem from index so we don't use it twice
-    index = index.drop(base_stem.index)
-
-    base_stem = base_stem.to_dict("records")[0]
-    base_tempo = base_stem["tempo_bin"]
-    tempo_octaves = [int(i * base_tempo) for i in [0.5, 1, 2, 4]]
-
-    index_filtered = index[
-        (index["tempo_bin"].isin(tempo_octaves))
-        & (index["instrument_name"] != base_stem["instrument_name"])
-    ]
-
-    # TODO: add instrument check
+    if sampler is None:
+        if index is None:
+            sampler = load_sampler(data_home, index_file)
+        else:
+            sampler = StemSampler(index)
 
     # TODO: what to do with undetermined stems?
-    # sample percussive stems
-    percussive = []
-    if n_percussive > 0:
-        percussive_index = index_filtered[index_filtered["sound_class"] == "percussive"]
-        # if len(percussive_index) < n_percussive:
-        #     print("no percussive tracks left on this tempo bin!")
-        percussive = percussive_index.sample(n_percussive).to_dict("records")
-
-    # sample harmonic stems
-    harmonic = []
-    if n_harmonic > 0:
-        harmonic_index = index_filtered[index_filtered["sound_class"] == "harmonic"]
-        # if len(harmonic_index) < n_harmonic:
-        #     print("no harmonic tracks left on this tempo bin!")
-        harmonic = harmonic_index.sample(n_harmonic).to_dict("records")
-
-    # combine everything into single list
-    stems = [base_stem] + percussive + harmonic
-    return stems, base_tempo
+    return sampler.sample(n_percussive, n_harmonic, rng=rng, base_stem=base_stem)
 
 
 def possible_tempo_bins(index, n_harmonic, n_percussive):
@@ -119,42 +138,160 @@ def possible_tempo_bins(index, n_harmonic, n_percussive):
     Returns
     -------
     possible_tempo : list
-        list with tempo_bins that have at least n_harmonic and n_percussive
-        tracks
+        list with tempo_bins that have a base stem whose tempo octaves have
+        at least n_harmonic and n_percussive tracks of other instruments
     """
+    return eligible_tempo_bins(stem_counts(index), n_harmonic, n_percussive)
 
-    all_tempo_bins = index["tempo_bin"].unique()
-    tempo_bin_count = index[["tempo_bin", "sound_class"]].value_counts()
 
-    possible_tempo = []
+def load_audio(audio_path, sr=22050, offset=0.0, duration=None):
+    r"""
+    Read a window of a stem as mono audio.
+
+    Only the frames inside the window are read from disk, and the audio is
+    resampled only if the file's sampling rate is not `sr`.
+
+    Parameters
+    ----------
+    audio_path : str
+        path to the audio file
+    sr : int
+        target sampling rate
+    offset : float
+        start of the window, in seconds
+    duration : float or None
+        length of the window, in seconds. if None, read until the end
+
+    Returns
+    -------
+    audio : np.ndarray
+        mono float32 audio
+    """
+    with sf.SoundFile(audio_path) as f:
+        native_sr = f.samplerate
+        start = int(np.round(offset * native_sr))
+        frames = -1 if duration is None else int(np.round(duration * native_sr))
+
+        f.seek(min(start, f.frames))
+        audio = f.read(frames, dtype="float32", always_2d=True)
+
+    audio = np.mean(audio, axis=1)
+
+    if native_sr != sr:
+        audio = librosa.resample(audio, orig_sr=native_sr, target_sr=sr)
+
+    return audio
+
+
+def _window_bytes(audio_path, offset=0.0, duration=None):
+    # bytes of the file holding the window read by `load_audio`, assuming a
+    # constant bitrate
+    size = os.path.getsize(audio_path)
+    file_duration = sf.info(audio_path).duration
 
-    for tempo in all_tempo_bins:
-        # hmmmm i'm not sure about this try/except blocks but i didnt find
-        # anything better for now
-        try:
-            qty_harmonic = tempo_bin_count[(tempo, "harmonic")]
-        except KeyError:
-            qty_harmonic = 0
+    if duration is None or file_duration == 0:
+        return size
 
-        try:
-            qty_percussive = tempo_bin_count[(tempo, "percussive")]
-        except KeyError:
-            qty_percussive = 0
+    window = min(duration, max(file_duration - offset, 0.0))
+    return int(size * window / file_duration)
 
-        if qty_harmonic >= n_harmonic and qty_percussive >= n_percussive:
-            possible_tempo.append(tempo)
 
-    return possible_tempo
+# stretch rates that can be reached by resampling, changing the pitch by
+# whole octaves
+OCTAVE_RATES = [0.25, 0.5, 2.0, 4.0]
+STRETCH_BACKENDS = ["phase_vocoder", "resample", "auto"]
+# extra input, in seconds, stretched beyond what the mixture needs so the
+# edges of the stretch don't end up in the mixture
+STRETCH_MARGIN = 0.1
+# input spans are rounded up to multiples of this, in seconds
+STRETCH_SPAN_STEP = 0.5
 
 
-def time_stretch(stems, base_tempo, duration=10.0, sr=22050):
+def _stretch_method(rate, backend="phase_vocoder", tolerance=0.01):
+    # returns the method actually used and the rate it applies
+    if backend not in STRETCH_BACKENDS:
+        raise ValueError(
+            f"Unknown stretch backend {backend}. Use one of {STRETCH_BACKENDS}"
+        )
+
+    if backend == "phase_vocoder":
+        return backend, rate
+
+    if backend == "auto" and abs(rate - 1.0) <= tolerance:
+        return "identity", 1.0
+
+    # resampling shifts the pitch by the same factor, which only keeps the
+    # stem in tune for whole octaves
+    if any(abs(rate / octave - 1.0) <= tolerance for octave in OCTAVE_RATES):
+        return "resample", rate
+
+    return "phase_vocoder", rate
+
+
+def stretch_audio(audio, rate, sr=22050, backend="phase_vocoder", tolerance=0.01):
+    r"""
+    Change the tempo of `audio` by `rate`.
+
+    Parameters
+    ----------
+    audio : np.ndarray
+        mono audio
+    rate : float
+        stretch factor. > 1 speeds up, < 1 slows down
+    sr : int
+        sampling rate
+    backend : str
+        * phase_vocoder: `librosa.effects.time_stretch`, keeps the pitch
+          (default)
+        * resample: play the audio faster / slower by resampling it if
+          `rate` is within `tolerance` of a whole octave (0.25, 0.5, 2, 4),
+          phase vocoder otherwise. much cheaper, but the pitch changes by
+          the same factor, so it's only in tune for whole octaves
+        * auto: same as resample, but no stretch at all if `rate` is within
+          `tolerance` of 1
+    tolerance : float
+        relative tolerance used by the "resample" and "auto" backends
+
+    Returns
+    -------
+    stretched_audio : np.ndarray
+    rate : float
+        stretch factor actually applied (1.0 if the audio was left as is)
+    """
+    method, rate = _stretch_method(rate, backend, tolerance)
+
+    return batch.apply_stretch(audio, rate, sr, method), rate
+
+
+def time_stretch(
+    stems,
+    base_tempo,
+    duration=10.0,
+    sr=22050,
+    cache=None,
+    backend="phase_vocoder",
+    tolerance=0.01,
+    profiler=None,
+):
     r"""
     Receive a base_tempo and stretch select stems to match it.
 
+    Stems that aren't cached are stretched together, see
+    `batch.stretch_batch`.
+
     Parameters
     ----------
     stems : list[dict]
     base_tempo : float
+    cache : AudioCache or None
+        cache of trimmed and stretched audio. the same stem is often
+        stretched to the same tempo across mixtures
+    backend : str
+        stretch backend, see `stretch_audio`
+    tolerance : float
+        tolerance of the "resample" and "auto" stretch backends, see `stretch_audio`
+    profiler : profiling.Profiler or None
+        if provided, record the "load", "trim" and "stretch" stages
 
     Returns
     -------
@@ -162,22 +299,127 @@ def time_stretch(stems, base_tempo, duration=10.0, sr=22050):
     """
 
     for s in stems:
-        stem_tempo = s["tempo"]
+        method, s["stretch_rate"] = _stretch_method(
+            base_tempo / s["tempo"], backend, tolerance
+        )
+        s["stretch_method"] = method
+
+    # with pre-computed beats, the alignment offsets are known before
+    # stretching, so each stem only needs to fill the mixture after its
+    # offset. otherwise, assume no offset
+    first_beats = [_precomputed_first_beat(s) for s in stems]
+    if all(t is not None for t in first_beats):
+        latest_beat_time = max(first_beats, default=0)
+        needed_durations = [
+            max(duration - (latest_beat_time - t), 0.0) for t in first_beats
+        ]
+    else:
+        needed_durations = [duration] * len(stems)
+
+    misses = []
+
+    for s, needed_duration in zip(stems, needed_durations):
+        if is_missing(s.get("cached_path")):
+            audio_path = os.path.join(s["data_home"], s["stem_name"])
+        else:
+            # copy already converted to the mixing sampling rate
+            audio_path = s["cached_path"]
+
+        method, new_tempo = s.pop("stretch_method"), s["stretch_rate"]
+
+        if is_missing(s.get("trim_start")):
+            # load enough audio for the slowest tempo octave
+            offset, span = None, duration * 2
+        else:
+            # silences were found during feature extraction, so we read
+            # only the input needed to fill `needed_duration` after stretching.
+            # the span is rounded up so it can be cached across mixtures
+            offset = s["trim_start"]
+            span = needed_duration * new_tempo + STRETCH_MARGIN
+            span = math.ceil(span / STRETCH_SPAN_STEP) * STRETCH_SPAN_STEP
+            span = min(span, s["trim_end"] - s["trim_start"])
+
+        key = (audio_path, sr, new_tempo, offset, span, method)
+        s["stretched_audio"] = cache.get(key) if cache is not None else None
+
+        if s["stretched_audio"] is None:
+            with profiling.stage(profiler, "load") as record:
+                audio = load_audio(
+                    audio_path, sr=sr, offset=offset or 0.0, duration=span
+                )
+                if profiler is not None:
+                    record["bytes_read"] += _window_bytes(audio_path, offset or 0.0, span)
+
+            if offset is None:
+                # removing silences at beginning and ending
+                with profiling.stage(profiler, "trim"):
+                    audio, _ = librosa.effects.trim(audio)
+
+            misses.append((s, key, audio, method))
+
+    with profiling.stage(profiler, "stretch"):
+        stretched_audios = batch.stretch_batch(
+            [audio for _, _, audio, _ in misses],
+            [s["stretch_rate"] for s, _, _, _ in misses],
+            [method for _, _, _, method in misses],
+            sr=sr,
+        )
 
-        audio_path = os.path.join(s["data_home"], s["stem_name"])
-        # removing silences at beginning and ending
-        audio, sr = librosa.load(audio_path, sr=sr, duration=duration * 2)
-        audio, _ = librosa.effects.trim(audio)
+    for (s, key, _, _), stretched_audio in zip(misses, stretched_audios):
+        if cache is not None:
+            stretched_audio = cache.put(key, stretched_audio)
 
-        new_tempo = base_tempo / stem_tempo
-        s["stretched_audio"] = librosa.effects.time_stretch(audio, rate=new_tempo)
+        s["stretched_audio"] = stretched_audio
 
     return stems
 
 
+def _precomputed_first_beat(stem):
+    # `first_beat` is measured in the original stem, `first_beat_time` in
+    # the stretched audio
+    beat_time = stem.get("first_beat")
+
+    if is_missing(stem.get("trim_start")) or is_missing(beat_time):
+        return None
+
+    return (beat_time - stem["trim_start"]) / stem["stretch_rate"]
+
+
+def first_beat_time(stem, sr=22050):
+    r"""
+    Time of the first beat of a stretched stem.
+
+    If the stem has a pre-computed `first_beat` and `trim_start`, the
+    first beat is derived from them and from the stretch rate. Otherwise, we
+    run beat tracking over the stretched audio.
+
+    Parameters
+    ----------
+    stem : dict
+        stem with its metadata, after `time_stretch`
+
+    Returns
+    -------
+    first_beat_time : float
+        in seconds, relative to the start of the stretched audio
+    """
+    precomputed = _precomputed_first_beat(stem)
+    if precomputed is not None:
+        return precomputed
+
+    _, beat_frames = librosa.beat.beat_track(y=stem["stretched_audio"], sr=sr)
+    beat_times = librosa.frames_to_time(beat_frames, sr=sr)
+
+    return beat_times[0]
+
+
 def align_first_beat(stems, sr=22050):
     r"""
-    Zero pad stems so their first beat is aligned.
+    Compute the offset that aligns the first beat of every stem.
+
+    No audio is copied: each stem gets an `offset` (in samples) of leading
+    silence, which is applied by `mix` when the stem is written into the
+    mixture.
 
     Parameters
     ----------
@@ -187,30 +429,34 @@ def align_first_beat(stems, sr=22050):
     Returns
     -------
     aligned_stems : list(dict)
-        stems with audio correct
+        stems with `audio` and `offset`
     """
 
     aligned_stems = stems.copy()
 
-    latest_beat_time = 0
+    tracked = []
 
     for s in aligned_stems:
-        _, beat_frames = librosa.beat.beat_track(y=s["stretched_audio"], sr=sr)
-        beat_times = librosa.frames_to_time(beat_frames, sr=sr)
-        s["first_beat_time"] = beat_times[0]
+        s["first_beat_time"] = _precomputed_first_beat(s)
 
-        if s["first_beat_time"] > latest_beat_time:
-            latest_beat_time = s["first_beat_time"]
+        if s["first_beat_time"] is None:
+            tracked.append(s)
+
+    # stems without pre-computed beats are beat tracked in a single batch
+    first_beat_times = batch.first_beat_times(
+        [s["stretched_audio"] for s in tracked], sr=sr
+    )
+    for s, beat_time in zip(tracked, first_beat_times):
+        s["first_beat_time"] = float(beat_time)
+
+    latest_beat_time = max(
+        (s["first_beat_time"] for s in aligned_stems), default=0
+    )
 
     for s in aligned_stems:
         shift_difference = np.abs(s["first_beat_time"] - latest_beat_time)
-        silence_samples = int(shift_difference * sr)
-        s["audio"] = np.pad(
-            s["stretched_audio"],
-            (silence_samples, 0),
-            "constant",
-            constant_values=(0, 0),
-        )
+        s["offset"] = int(shift_difference * sr)
+        s["audio"] = s["stretched_audio"]
 
     return aligned_stems
 
@@ -237,21 +483,180 @@ def mix(duration, stems, strategy="zeros", sr=22050):
 
     Returns
     ----------
-    None
+    mixture : np.ndarray
+        float32 mixture audio
+    stems : list[dict]
+        stems whose `audio` is now the aligned, scaled stem, with the
+        mixture duration
     """
 
     mixture_length = int(duration * sr)
-    mixture_audio = np.zeros(mixture_length)
+
+    # every stem is written once, at its offset and scaled by its gain, into
+    # a single float32 buffer. the rest of the buffer stays silent
+    stems_audio = np.zeros((len(stems), mixture_length), dtype=np.float32)
+    mixture_audio = np.zeros(mixture_length, dtype=np.float32)
 
     # TODO: implement strategies
-    for s in stems:
-        # pad ending with zeros
-        s["audio"] = librosa.util.fix_length(data=s["audio"], size=mixture_length)
-        mixture_audio += s["audio"]
+    for s, stem_audio in zip(stems, stems_audio):
+        offset = min(s.get("offset", 0), mixture_length)
+        n_samples = min(len(s["audio"]), mixture_length - offset)
+        window = slice(offset, offset + n_samples)
+
+        np.multiply(s["audio"][:n_samples], s.get("gain", 1.0), out=stem_audio[window])
+        np.add(mixture_audio[window], stem_audio[window], out=mixture_audio[window])
+
+        s["audio"] = stem_audio
 
     return mixture_audio, stems
 
 
+def mixture_rng(seed, mixture_index):
+    r"""
+    Random generator of a single mixture.
+
+    The generator only depends on the master `seed` and on the position of
+    the mixture, so any mixture can be regenerated on its own and the output
+    does not depend on the number of workers.
+
+    Parameters
+    ----------
+    seed : int
+        master seed
+    mixture_index : int
+        position of the mixture in the batch
+
+    Returns
+    -------
+    rng : np.random.Generator
+    """
+    return np.random.default_rng(
+        np.random.SeedSequence(seed, spawn_key=(mixture_index,))
+    )
+
+
+def _mixture_id(rng):
+    # drawn first from the generator of the mixture, so the id of a mixture
+    # is known without generating it
+    return str(uuid.UUID(bytes=rng.bytes(16), version=4))
+
+
+def generate_mixture(
+    sampler,
+    data_home,
+    n_harmonic,
+    n_percussive,
+    duration,
+    seed,
+    mixture_index,
+    index_file="index.csv",
+    cache=None,
+    stretch_backend="phase_vocoder",
+    profiler=None,
+):
+    r"""
+    Create a single mixture without saving it.
+
+    Parameters
+    ----------
+    sampler : StemSampler or StoreSampler
+        sampler returned by `load_sampler`
+    data_home : str
+        path to stems
+    n_harmonic : int
+        number of harmonic stems
+    n_percussive : int
+        number of percussive stems
+    duration : float
+        mixture duration
+    seed : int
+        master seed
+    mixture_index : int
+        position of the mixture in the batch
+    index_file : str
+        index file with pre-computed features
+    cache : AudioCache or None
+        cache of trimmed and stretched audio
+    stretch_backend : str
+        stretch backend, see `stretch_audio`
+    profiler : profiling.Profiler or None
+        if provided, record the "select", "load", "trim", "stretch", "beat",
+        "normalize" and "mix" stages
+
+    Returns
+    -------
+    mixture_id : str
+        deterministic identifier of the mixture
+    mixture : np.array
+        mixture audio
+    stems : list[dict]
+        stems used to create the mixture
+    """
+    rng = mixture_rng(seed, mixture_index)
+    mixture_id = _mixture_id(rng)
+
+    with profiling.stage(profiler, "select"):
+        stems, base_tempo = select_stems(
+            n_percussive, n_harmonic, data_home, index_file, base_stem=None,
+            rng=rng, sampler=sampler
+        )
+    stems = time_stretch(
+        stems, base_tempo, duration, cache=cache, backend=stretch_backend,
+        profiler=profiler
+    )
+    with profiling.stage(profiler, "beat"):
+        stems = align_first_beat(stems)
+    with profiling.stage(profiler, "normalize"):
+        stems = normalize(stems)
+
+    with profiling.stage(profiler, "mix"):
+        mixture, stems = mix(duration, stems)
+
+    return mixture_id, mixture, stems
+
+
+# sampler and cache shared by all the mixtures generated in a worker process
+_worker_state = {}
+
+
+def _init_worker(sampler, cache_size, cache_dir, profile=False, hook=None):
+    _worker_state["sampler"] = sampler
+    _worker_state["cache"] = None
+    _worker_state["profile"] = profile
+    _worker_state["hook"] = hook
+
+    if cache_size > 0 or cache_dir is not None:
+        _worker_state["cache"] = AudioCache(max_bytes=cache_size, cache_dir=cache_dir)
+
+
+def _mixture_job(params, mixture_index):
+    # each job records its own stages, which are merged by the parent
+    profiler = None
+    if _worker_state["profile"]:
+        profiler = profiling.Profiler(hook=_worker_state["hook"])
+
+    result = generate_mixture(
+        _worker_state["sampler"],
+        mixture_index=mixture_index,
+        cache=_worker_state["cache"],
+        profiler=profiler,
+        **params,
+    )
+
+    # the stretched audio is only needed to build the mixture, don't send it
+    # back to the parent process along with the mixed audio
+    mixture_id, mixture, stems = result
+    for s in stems:
+        s.pop("stretched_audio", None)
+
+    return (mixture_id, mixture, stems), profiler.records if profiler is not None else []
+
+
+def _profiled_save(save_fn, profiler, mixture, stems, mixture_id=None):
+    with profiling.stage(profiler, "save") as record:
+        record["bytes_written"] += save_fn(mixture, stems, mixture_id=mixture_id)
+
+
 def generate_mixtures(
     data_home,
     n_mixtures,
@@ -261,6 +666,16 @@ def generate_mixtures(
     duration,
     index_file="index.csv",
     output_folder="mixtures",
+    seed=None,
+    workers=1,
+    cache_size=0,
+    cache_dir=None,
+    writers=2,
+    output_format="folder",
+    shard_size=1000,
+    stretch_backend="phase_vocoder",
+    profile=None,
+    profile_hook=None,
 ):
     """
     Main method to generate mixtures
@@ -279,44 +694,186 @@ def generate_mixtures(
         number of percussive stems
     duration : float
         mixture duration
+    index_file : str
+        index file with pre-computed features
+    output_folder : str
+        folder where to save the mixtures. mixtures already saved there by a
+        run with the same seed, as folders or in complete tar shards, are
+        skipped, so an interrupted run can be resumed
+    seed : int or None
+        master seed. mixture `i` is always generated from `(seed, i)`, so
+        the output is identical for any number of workers. if None, a
+        random seed is drawn and printed
+    workers : int
+        number of worker processes
+    cache_size : int
+        memory budget, in bytes, of the stretched audio cache of each
+        worker. 0 disables the in-memory cache
+    cache_dir : str or None
+        folder for the on-disk stretched audio cache, shared by all workers
+    writers : int
+        number of threads writing mixtures to disk while the next ones are
+        generated. if 0, mixtures are written synchronously
+    output_format : str
+        * folder: one folder per mixture with one WAV per stem and a JSON
+          sidecar (default)
+        * tar: mixtures packed into tar shards, see `writers.ShardWriter`
+    shard_size : int
+        number of mixtures per shard when `output_format` is "tar"
+    stretch_backend : str
+        * phase_vocoder: keep the pitch of every stem (default)
+        * resample: resample stems that are a whole tempo octave away,
+          changing their pitch by whole octaves
+        * auto: skip stems that are already at the right tempo and resample
+          stems that are a whole tempo octave away
+        see `stretch_audio`
+    profile : str or None
+        if provided, record the time spent in every stage (select, load,
+        trim, stretch, beat, normalize, mix and save) and save a summary to
+        this path (.json or .csv), see `profiling.Profiler`
+    profile_hook : callable or None
+        hook for external profilers, see `profiling.Profiler`
 
     Returns
     -------
     None
+
+    Raises
+    ------
+    ValueError
+        if no tempo bin can provide `n_harmonic` and `n_percussive` stems
+    RuntimeError
+        if any mixture could not be generated. the other mixtures are still
+        written
     """
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+        print(f"Generating mixtures with seed {seed}")
+
+    # the index is read and bucketed only once and shared by all mixtures
+    sampler = load_sampler(data_home, index_file)
+
+    # a configuration that can't be drawn would fail every mixture the same way
+    if len(sampler.tempo_bins(n_harmonic, n_percussive)) == 0:
+        raise ValueError(
+            f"No tempo bin of {index_file} can provide {n_harmonic} harmonic and "
+            f"{n_percussive} percussive stems"
+        )
+
+    params = {
+        "data_home": data_home,
+        "n_harmonic": n_harmonic,
+        "n_percussive": n_percussive,
+        "duration": duration,
+        "seed": seed,
+        "index_file": index_file,
+        "stretch_backend": stretch_backend,
+    }
+
+    if output_format == "folder":
+        shards = None
+        save_fn, threads = functools.partial(save_mixture, output_folder), writers
+        done = {
+            i for i in range(n_mixtures)
+            if os.path.exists(
+                os.path.join(output_folder, _mixture_id(mixture_rng(seed, i)))
+            )
+        }
+    elif output_format == "tar":
+        # shards are written sequentially, a single thread keeps the order
+        shards = ShardWriter(output_folder, shard_size=shard_size)
+        save_fn, threads = shards.write, min(writers, 1)
+        done = {
+            i for i in range(n_mixtures)
+            if _mixture_id(mixture_rng(seed, i)) in shards.mixture_ids
+        }
+    else:
+        raise ValueError(f"Unknown output format {output_format}")
+
+    if len(done) > 0:
+        print(f"Skipping {len(done)} mixtures already saved in {output_folder}")
+    mixture_indices = [i for i in range(n_mixtures) if i not in done]
+
+    results = parallel.imap(
+        functools.partial(_mixture_job, params),
+        mixture_indices,
+        workers=workers,
+        description="Generating mixtures",
+        # one mixture per chunk: with the bounded number of chunks in flight,
+        # at most a few mixtures per worker wait in memory to be written
+        chunksize=1,
+        initializer=_init_worker,
+        initargs=(sampler, cache_size, cache_dir, profile is not None, profile_hook),
+    )
+
+    profiler = None
+    if profile is not None:
+        profiler = profiling.Profiler(hook=profile_hook)
+        save_fn = functools.partial(_profiled_save, save_fn, profiler)
+
+    writer = MixtureWriter(save_fn, threads=threads)
+
+    failed = []
+    with writer:
+        for mixture_index, (result, error) in zip(mixture_indices, results):
+            if error is not None:
+                failed.append((mixture_index, error))
+                continue
+
+            (mixture_id, mixture, stems), records = result
+            if profiler is not None:
+                profiler.extend(records)
 
-    stems, base_tempo = select_stems(n_percussive, n_harmonic, data_home,
-            index_file, base_stem=None)
-    stems = time_stretch(stems, base_tempo, duration)
-    stems = align_first_beat(stems)
-    stems = normalize(stems)
+            writer.submit(mixture, stems, mixture_id=mixture_id)
 
-    mixture, stems = mix(duration, stems)
-    save_mixture(output_folder, mixture, stems)
+    if shards is not None:
+        shards.close()
+
+    if len(failed) > 0:
+        print(f"{len(failed)} mixtures could not be generated:")
+        for mixture_index, error in failed:
+            print(f"  {mixture_index}: {error.strip().splitlines()[-1]}")
+
+    if profiler is not None:
+        print("Time spent per stage:")
+        profiler.report()
+        profiler.save(profile)
+
+    if len(failed) > 0:
+        raise RuntimeError(f"{len(failed)} of {n_mixtures} mixtures could not be generated")
 
     return
 
+
 def normalize(stems):
-    min_rms = np.inf
+    r"""
+    Compute the gain that brings every stem to the RMS of the quietest one.
 
-    # get minimal RMS
-    for s in stems:
-        # should we move this away from here maybe?
-        # maybe calculate together with the metadata?
-        rms = np.sqrt(np.mean(s["audio"]**2))
-        # s["rms"] = np.sqrt(np.mean(s["audio"]))
-        s["rms"] = rms
+    The gain is stored as `gain` and applied by `mix`, so no scaled copy of
+    the audio is created here. The RMS takes the leading silence given by
+    `offset` into account.
 
-        if s["rms"] < min_rms:
-            min_rms = s["rms"]
+    Parameters
+    ----------
+    stems : list[dict]
+        stems with `audio` (and optionally `offset`)
 
-    for s in stems:
-        s["audio"] = s["audio"]*(min_rms/s["rms"])
+    Returns
+    -------
+    stems : list[dict]
+        stems with `rms` and `gain`
+    """
+    rms = batch.rms([s["audio"] for s in stems], [s.get("offset", 0) for s in stems])
+    min_rms = rms.min(initial=np.inf)
+
+    for s, stem_rms in zip(stems, rms):
+        s["rms"] = float(stem_rms)
+        s["gain"] = float(min_rms / stem_rms)
 
     return stems
 
 
-def save_mixture(output_folder, mixture, stems, sr=22050):
+def save_mixture(output_folder, mixture, stems, sr=22050, mixture_id=None):
     """
     write mixture to .wav file and metadata to .json file
 
@@ -328,29 +885,40 @@ def save_mixture(output_folder, mixture, stems, sr=22050):
         mixture audio
     stems : dict
         dictionary with metadata about the stems used to create the mixture
+    mixture_id : str or None
+        name of the mixture. if None, a random UUID is used
 
     Returns
     -------
-    None
+    bytes_written : int
+        size of the files written
     """
     os.makedirs(output_folder, exist_ok=True)
-    mixture_id = str(uuid.uuid4())
+    if mixture_id is None:
+        mixture_id = str(uuid.uuid4())
     mixture_path = os.path.join(output_folder, mixture_id)
 
-    os.makedirs(mixture_path)
-    sf.write(f"{mixture_path}/mixture.wav", mixture, sr)
+    if os.path.exists(mixture_path):
+        raise FileExistsError(f"Mixture {mixture_path} already exists")
 
-    for s in stems:
-        sf.write(f"{mixture_path}/{s['stem_name']}.wav", s["audio"], sr)
-        # remove
-        s.pop("stretched_audio", None)
-        s.pop("audio", None)
-        s.pop("rms", None)
+    # the folder is renamed last: a mixture whose folder exists is complete
+    with atomic_write(mixture_path) as tmp_path:
+        os.makedirs(tmp_path)
 
-    with open(f"{mixture_path}.json", "w") as f:
-        json.dump(stems, f)
+        sf.write(f"{tmp_path}/mixture.wav", mixture, sr)
 
-    return
+        for s in stems:
+            sf.write(f"{tmp_path}/{s['stem_name']}.wav", s["audio"], sr)
+
+        with atomic_write(f"{mixture_path}.json") as tmp_json_path:
+            with open(tmp_json_path, "w") as f:
+                json.dump([stem_metadata(s) for s in stems], f)
+
+            bytes_written = os.path.getsize(tmp_json_path) + sum(
+                entry.stat().st_size for entry in os.scandir(tmp_path)
+            )
+
+    return bytes_written
 
 
 if __name__ == "__main__":
@@ -406,21 +974,85 @@ if __name__ == "__main__":
         "--index_file",
         required=False,
         default="index.csv",
-        help="index file with pre-computed features",
+        help="index file with pre-computed features (.csv, .npz, .parquet, .feather, "
+        ".sqlite or .db)",
+        type=str,
+    )
+    parser.add_argument(
+        "--seed",
+        required=False,
+        default=None,
+        help="master seed. the same seed always generates the same mixtures",
+        type=int,
+    )
+    parser.add_argument(
+        "--workers",
+        required=False,
+        default=1,
+        help="number of worker processes",
+        type=int,
+    )
+
+    parser.add_argument(
+        "--cache_size",
+        required=False,
+        default=0,
+        help="memory budget of the stretched audio cache of each worker, in MB",
+        type=int,
+    )
+    parser.add_argument(
+        "--cache_dir",
+        required=False,
+        default=None,
+        help="folder of the on-disk stretched audio cache",
+        type=str,
+    )
+
+    parser.add_argument(
+        "--writers",
+        required=False,
+        default=2,
+        help="number of threads writing mixtures to disk. 0 writes synchronously",
+        type=int,
+    )
+
+    parser.add_argument(
+        "--output_format",
+        required=False,
+        default="folder",
+        choices=["folder", "tar"],
+        help="one folder per mixture, or mixtures packed into tar shards",
+        type=str,
+    )
+    parser.add_argument(
+        "--shard_size",
+        required=False,
+        default=1000,
+        help="number of mixtures per tar shard",
+        type=int,
+    )
+
+    parser.add_argument(
+        "--stretch_backend",
+        required=False,
+        default="phase_vocoder",
+        choices=STRETCH_BACKENDS,
+        help="time stretch method. auto skips or resamples stems at tempo octaves",
+        type=str,
+    )
+    parser.add_argument(
+        "--profile",
+        required=False,
+        default=None,
+        help="save the time spent in each stage to this file (.json or .csv)",
         type=str,
     )
 
     args = parser.parse_args()
+    args.cache_size = args.cache_size * 2**20
 
     if args.n_harmonic + args.n_percussive != args.n_stems:
         args.n_harmonic = args.n_stems // 2
         args.n_percussive = args.n_stems - args.n_harmonic
 
-    pbar = tqdm.tqdm(range(args.n_mixtures))
-    pbar.set_description("Generating mixtures")
-    kwargs = vars(args)
-
-    for i in pbar:
-        # each mixture has its own arguments
-        mixture_args = kwargs.copy()
-        generate_mixtures(**mixture_args)
+    generate_mixtures(**vars(args))
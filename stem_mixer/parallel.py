@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. autosummary::
+   :toctree: generated/
+
+   limit_threads
+   imap
+   run
+"""
+import collections
+import concurrent.futures
+import functools
+import itertools
+import os
+import traceback
+
+import tqdm
+
+# native thread pools that would otherwise spawn one thread per core inside
+# every worker process
+THREAD_ENV_VARS = [
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+    "NUMBA_NUM_THREADS",
+]
+
+
+def limit_threads(n_threads=1):
+    r"""
+    Cap the number of threads used by BLAS, OpenMP and numba in the current
+    process. Used as initializer of worker processes so `workers` processes
+    don't oversubscribe the machine.
+
+    Parameters
+    ----------
+    n_threads : int
+        maximum number of threads per process
+
+    Returns
+    -------
+    None
+    """
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(n_threads)
+
+    # libraries that were already loaded (e.g. by a forked parent) ignore the
+    # environment, so we also limit them at runtime when possible
+    try:
+        import threadpoolctl
+
+        threadpoolctl.threadpool_limits(n_threads)
+    except ImportError:
+        pass
+
+    try:
+        import numba
+
+        numba.set_num_threads(min(n_threads, numba.config.NUMBA_NUM_THREADS))
+    except ImportError:
+        pass
+
+    return
+
+
+def _guarded(func, job):
+    # never let an exception escape a worker: a single bad stem would
+    # otherwise abort the whole pool
+    try:
+        return func(job), None
+    except Exception:
+        return None, traceback.format_exc()
+
+
+def _run_chunk(func, chunk):
+    return [func(job) for job in chunk]
+
+
+def imap(func, jobs, workers=1, description=None, chunksize=None, initializer=None,
+         initargs=(), max_pending=None):
+    r"""
+    Lazily apply `func` to every job, optionally over a process pool.
+
+    Exceptions raised by `func` are caught and reported instead of stopping
+    the other jobs.
+
+    Jobs are sent to the pool in chunks, and only `max_pending` chunks are
+    in flight at once: results that were computed but not consumed yet
+    stay bounded when the caller is slower than the workers, e.g. when it
+    writes every result to a slow disk.
+
+    Parameters
+    ----------
+    func : callable
+        picklable function receiving a single job
+    jobs : list
+        arguments for `func`
+    workers : int
+        number of worker processes. if 1, run in the current process
+    description : str or None
+        description of the progress bar
+    chunksize : int or None
+        number of jobs sent to a worker at once. if None, split the jobs in
+        roughly 4 chunks per worker
+    initializer : callable or None
+        function called once in every worker process, after the thread
+        limits are applied
+    initargs : tuple
+        arguments for `initializer`
+    max_pending : int or None
+        maximum number of chunks submitted to the pool whose results weren't
+        consumed yet. if None, 2 per worker
+
+    Yields
+    ------
+    result : tuple
+        one `(result, error)` tuple per job, in the same order as `jobs`.
+        `error` is None on success, otherwise the formatted traceback and
+        `result` is None.
+    """
+    jobs = list(jobs)
+    guarded = functools.partial(_guarded, func)
+
+    pbar = tqdm.tqdm(total=len(jobs))
+    pbar.set_description(description)
+
+    if workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+
+        for job in jobs:
+            yield guarded(job)
+            pbar.update()
+    else:
+        if chunksize is None:
+            chunksize = max(1, len(jobs) // (workers * 4))
+        if max_pending is None:
+            max_pending = 2 * workers
+
+        chunks = (jobs[i:i + chunksize] for i in range(0, len(jobs), chunksize))
+
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_initialize_worker,
+            initargs=(initializer, initargs),
+        ) as executor:
+            pending = collections.deque(
+                executor.submit(_run_chunk, guarded, chunk)
+                for chunk in itertools.islice(chunks, max_pending)
+            )
+
+            while len(pending) > 0:
+                results = pending.popleft().result()
+
+                # submit the next chunk before yielding, so the workers keep
+                # busy while the results are consumed
+                for chunk in itertools.islice(chunks, 1):
+                    pending.append(executor.submit(_run_chunk, guarded, chunk))
+
+                for result in results:
+                    yield result
+                    pbar.update()
+
+    pbar.close()
+
+
+def run(func, jobs, workers=1, description=None, chunksize=None, initializer=None,
+        initargs=(), max_pending=None):
+    r"""
+    Apply `func` to every job, optionally over a process pool.
+
+    Same as `imap`, but waits for all the jobs and returns a list.
+
+    Returns
+    -------
+    results : list[tuple]
+        one `(result, error)` tuple per job, in the same order as `jobs`.
+    """
+    return list(
+        imap(
+            func,
+            jobs,
+            workers=workers,
+            description=description,
+            chunksize=chunksize,
+            initializer=initializer,
+            initargs=initargs,
+            max_pending=max_pending,
+        )
+    )
+
+
+def _initialize_worker(initializer, initargs):
+    limit_threads(1)
+
+    if initializer is not None:
+        initializer(*initargs)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. autosummary::
+   :toctree: generated/
+
+   Profiler
+   stage
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# extensions supported by `Profiler.save`
+PROFILE_FORMATS = [".json", ".csv"]
+PERCENTILES = [50, 90, 99]
+
+
+def _empty_record(name):
+    return {
+        "stage": name,
+        "wall_time": 0.0,
+        "cpu_time": 0.0,
+        "bytes_read": 0,
+        "bytes_written": 0,
+    }
+
+
+class Profiler:
+    r"""
+    Record the wall time, CPU time and bytes moved by each pipeline stage.
+
+    Every `stage` block adds one record. Records from worker processes are
+    merged with `extend`, and `summary` aggregates them per stage.
+
+    CPU time is the time of the thread running the stage, so stages running
+    in writer threads are measured on their own. Bytes are the on-disk sizes
+    of the files, or parts of files, read or written by the stage.
+
+    Parameters
+    ----------
+    hook : callable or None
+        called with the stage name when a stage starts. it must return a
+        context manager, which is entered for the duration of the stage.
+        e.g. ``torch.profiler.record_function`` to annotate stages in an
+        external profiler. it must be picklable to run in worker processes
+    """
+
+    def __init__(self, hook=None):
+        self.hook = hook
+        self.records = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        r"""
+        Measure a block of code.
+
+        Parameters
+        ----------
+        name : str
+            stage name
+
+        Yields
+        ------
+        record : dict
+            record of the stage. the block may add to its `bytes_read` and
+            `bytes_written`
+        """
+        record = _empty_record(name)
+        hook = self.hook(name) if self.hook is not None else contextlib.nullcontext()
+
+        with hook:
+            wall_time, cpu_time = time.perf_counter(), time.thread_time()
+            try:
+                yield record
+            finally:
+                record["wall_time"] = time.perf_counter() - wall_time
+                record["cpu_time"] = time.thread_time() - cpu_time
+
+        with self._lock:
+            self.records.append(record)
+
+    def extend(self, records):
+        r"""
+        Add records measured somewhere else, e.g. in a worker process.
+
+        Parameters
+        ----------
+        records : list[dict]
+        """
+        with self._lock:
+            self.records.extend(records)
+
+    def summary(self, percentiles=PERCENTILES):
+        r"""
+        Aggregate the records per stage.
+
+        Parameters
+        ----------
+        percentiles : list[int]
+            percentiles of the wall and CPU time of each stage
+
+        Returns
+        -------
+        summary : dict
+            for every stage, its `count`, the totals and percentiles of
+            `wall_time` and `cpu_time`, and the totals of `bytes_read`
+            and `bytes_written`
+        """
+        with self._lock:
+            records = list(self.records)
+
+        summary = {}
+        for name in dict.fromkeys(r["stage"] for r in records):
+            stage_records = [r for r in records if r["stage"] == name]
+            stats = {"count": len(stage_records)}
+
+            for field in ["wall_time", "cpu_time"]:
+                values = np.array([r[field] for r in stage_records])
+                stats[f"{field}_total"] = float(values.sum())
+                stats[f"{field}_mean"] = float(values.mean())
+                for q, value in zip(percentiles, np.percentile(values, percentiles)):
+                    stats[f"{field}_p{q}"] = float(value)
+
+            for field in ["bytes_read", "bytes_written"]:
+                stats[field] = int(sum(r[field] for r in stage_records))
+
+            summary[name] = stats
+
+        return summary
+
+    def save(self, path):
+        r"""
+        Write the summary of the records to disk.
+
+        Parameters
+        ----------
+        path : str
+            .json for a `{stage: stats}` object, .csv for one row per stage
+        """
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in PROFILE_FORMATS:
+            raise ValueError(
+                f"Unsupported profile format {extension}. Use one of {PROFILE_FORMATS}"
+            )
+
+        summary = self.summary()
+
+        if extension == ".json":
+            with open(path, "w") as f:
+                json.dump(summary, f, indent=4)
+        else:
+            df = pd.DataFrame.from_dict(summary, orient="index")
+            df.to_csv(path, index_label="stage")
+
+    def report(self):
+        r"""
+        Print the total and median wall time of each stage.
+        """
+        for name, stats in self.summary().items():
+            print(
+                f"  {name}: {stats['count']} calls, "
+                f"{stats['wall_time_total']:.2f}s total, "
+                f"{stats['wall_time_p50'] * 1000:.1f}ms median"
+            )
+
+
+def stage(profiler, name):
+    r"""
+    `profiler.stage(name)`, or a block that records nothing if `profiler`
+    is None.
+
+    Parameters
+    ----------
+    profiler : Profiler or None
+    name : str
+        stage name
+
+    Returns
+    -------
+    context : context manager
+        yields the record of the stage
+    """
+    if profiler is None:
+        return contextlib.nullcontext(_empty_record(name))
+
+    return profiler.stage(name)
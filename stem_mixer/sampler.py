@@ -0,0 +1,441 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. autosummary::
+   :toctree: generated/
+
+   BaseSampler
+   StemSampler
+   stem_counts
+   tempo_table
+   add_octave_counts
+   eligible_base_instruments
+   eligible_tempo_bins
+   is_missing
+"""
+import numpy as np
+import pandas as pd
+
+# tempo bins compatible with the tempo bin of the base stem
+TEMPO_OCTAVES = [0.5, 1, 2, 4]
+
+
+def is_missing(value):
+    r"""
+    Whether a metadata value is missing: None in the JSON metadata, NaN or
+    NA in an index.
+
+    Parameters
+    ----------
+    value : object
+
+    Returns
+    -------
+    missing : bool
+    """
+    return value is None or value is pd.NA or (
+        isinstance(value, (float, np.floating)) and np.isnan(value)
+    )
+
+
+def stem_counts(index):
+    r"""
+    Count the stems per tempo bin, sound class and instrument.
+
+    Parameters
+    ----------
+    index : pd.DataFrame
+        dataframe with stems information
+
+    Returns
+    -------
+    counts : pd.DataFrame
+        with `tempo_bin`, `sound_class`, `instrument_name` and `count`
+        columns. `instrument_name` is None for stems without instrument
+    """
+    if "instrument_name" in index:
+        instrument = index["instrument_name"].astype(object)
+    else:
+        instrument = pd.Series(None, index=index.index, dtype=object)
+
+    counts = (
+        pd.DataFrame({
+            "tempo_bin": index["tempo_bin"],
+            "sound_class": index["sound_class"],
+            "instrument_name": instrument.where(instrument.notna(), None),
+        })
+        .dropna(subset=["tempo_bin", "sound_class"])
+        .groupby(["tempo_bin", "sound_class", "instrument_name"], dropna=False)
+        .size()
+        .reset_index(name="count")
+    )
+    counts["instrument_name"] = counts["instrument_name"].astype(object)
+    counts.loc[counts["instrument_name"].isna(), "instrument_name"] = None
+
+    return counts
+
+
+def tempo_table(index):
+    r"""
+    Count the stems of each sound class per tempo bin.
+
+    Parameters
+    ----------
+    index : pd.DataFrame
+        dataframe with stems information
+
+    Returns
+    -------
+    table : pd.DataFrame
+        indexed by tempo_bin, with the number of `harmonic` and `percussive`
+        stems in the bin, and `octave_harmonic` / `octave_percussive` with the
+        number of stems in all the tempo octaves of the bin (the bin itself
+        included)
+    """
+    return _tempo_table(stem_counts(index))
+
+
+def _tempo_table(counts):
+    # `tempo_table` from the counts returned by `stem_counts`
+    table = counts.pivot_table(
+        index="tempo_bin", columns="sound_class", values="count",
+        aggfunc="sum", fill_value=0,
+    ).reindex(columns=["harmonic", "percussive"], fill_value=0)
+    table.columns.name = None
+
+    return add_octave_counts(table.astype(np.int64))
+
+
+def add_octave_counts(table):
+    r"""
+    Add the number of stems in all the tempo octaves of every tempo bin.
+
+    Parameters
+    ----------
+    table : pd.DataFrame
+        indexed by tempo_bin, with the number of `harmonic` and
+        `percussive` stems in the bin
+
+    Returns
+    -------
+    table : pd.DataFrame
+        the same table, with `octave_harmonic` and `octave_percussive`
+    """
+    for sound_class in ["harmonic", "percussive"]:
+        octave_count = np.zeros(len(table), dtype=np.int64)
+
+        for factor in TEMPO_OCTAVES:
+            octave_bins = [int(factor * tempo_bin) for tempo_bin in table.index]
+            octave_count += (
+                table[sound_class].reindex(octave_bins, fill_value=0).to_numpy()
+            )
+
+        table[f"octave_{sound_class}"] = octave_count
+
+    return table
+
+
+def eligible_base_instruments(counts, n_harmonic, n_percussive):
+    r"""
+    Instruments of the base stems from which a mixture with `n_harmonic`
+    and `n_percussive` stems can be drawn, per tempo bin.
+
+    The base stem is percussive if `n_percussive` > 0, harmonic otherwise.
+    The other stems are drawn from the tempo octaves of its bin, leaving
+    out the base stem and the stems sharing its instrument, so the
+    instrument of the base stem decides whether there are enough of them.
+
+    Parameters
+    ----------
+    counts : pd.DataFrame
+        counts returned by `stem_counts`
+    n_harmonic : int
+        number of harmonic stems for a given mixture
+    n_percussive : int
+        number of percussive stems for a given mixture
+
+    Returns
+    -------
+    instruments : dict
+        eligible tempo bins, sorted, mapped to the list of instruments a base
+        stem of the bin can have (None for stems without instrument)
+    """
+    base_class = "percussive" if n_percussive > 0 else "harmonic"
+    needed = {"harmonic": n_harmonic, "percussive": n_percussive}
+    needed[base_class] -= 1
+
+    by_class = {}
+    by_instrument = {}
+    for tempo_bin, sound_class, instrument, count in counts.itertuples(index=False):
+        key = (tempo_bin, sound_class)
+        by_class[key] = by_class.get(key, 0) + count
+        if instrument is not None:
+            by_instrument[key + (instrument,)] = count
+
+    def octave_count(tempo_bin, sound_class, instrument=None):
+        if instrument is None:
+            return sum(by_class.get((int(f * tempo_bin), sound_class), 0)
+                       for f in TEMPO_OCTAVES)
+        return sum(by_instrument.get((int(f * tempo_bin), sound_class, instrument), 0)
+                   for f in TEMPO_OCTAVES)
+
+    instruments = {}
+    for tempo_bin, sound_class, instrument, _ in counts.itertuples(index=False):
+        if sound_class != base_class:
+            continue
+
+        eligible = True
+        for c in ["harmonic", "percussive"]:
+            available = octave_count(tempo_bin, c)
+            if instrument is not None:
+                available -= octave_count(tempo_bin, c, instrument)
+            elif c == base_class:
+                # the base stem itself
+                available -= 1
+            eligible &= available >= needed[c]
+
+        if eligible:
+            instruments.setdefault(tempo_bin, []).append(instrument)
+
+    return dict(sorted(instruments.items()))
+
+
+def eligible_tempo_bins(counts, n_harmonic, n_percussive):
+    r"""
+    Tempo bins from which a mixture with `n_harmonic` and `n_percussive`
+    stems can be drawn.
+
+    A bin is eligible if one of its stems can be used as base stem: see
+    `eligible_base_instruments`.
+
+    Parameters
+    ----------
+    counts : pd.DataFrame
+        counts returned by `stem_counts`
+    n_harmonic : int
+        number of harmonic stems for a given mixture
+    n_percussive : int
+        number of percussive stems for a given mixture
+
+    Returns
+    -------
+    tempo_bins : list
+    """
+    return list(eligible_base_instruments(counts, n_harmonic, n_percussive))
+
+
+class BaseSampler:
+    r"""
+    Selection rules shared by the samplers.
+
+    A base stem is drawn from a random eligible tempo bin (percussive if
+    `n_percussive` > 0, harmonic otherwise). The other stems are drawn
+    without replacement from the tempo octaves of the base stem, and can't
+    share its instrument.
+
+    Subclasses only look stems up. They pass the counts of their stems to
+    `BaseSampler.__init__` and provide:
+
+    * ``_candidates(tempo_bins, sound_class, exclude_instrument, instruments)``:
+      sorted arrays of the ids of the matching stems, only of `instruments`
+      if provided. a stem without `instrument_name` is compatible with every
+      instrument
+    * ``_stems(ids)``: metadata of the stems with these ids
+    * ``_id(stem_name)``: id of a stem
+
+    Parameters
+    ----------
+    counts : pd.DataFrame
+        counts of the stems, see `stem_counts`
+    """
+
+    def __init__(self, counts):
+        self.counts = counts
+        self.tempo_table = _tempo_table(counts)
+        self._base_instruments = {}
+
+    def tempo_bins(self, n_harmonic, n_percussive):
+        r"""
+        Tempo bins from which `n_harmonic` harmonic and `n_percussive`
+        percussive stems can be drawn. See `eligible_tempo_bins`.
+        """
+        return list(self.base_instruments(n_harmonic, n_percussive))
+
+    def base_instruments(self, n_harmonic, n_percussive):
+        r"""
+        Instruments of the base stems from which `n_harmonic` harmonic and
+        `n_percussive` percussive stems can be drawn, per tempo bin. See
+        `eligible_base_instruments`.
+        """
+        key = (n_harmonic, n_percussive)
+
+        if key not in self._base_instruments:
+            self._base_instruments[key] = eligible_base_instruments(
+                self.counts, n_harmonic, n_percussive
+            )
+
+        return self._base_instruments[key]
+
+    def sample(self, n_percussive, n_harmonic, rng=None, base_stem=None):
+        r"""
+        Select the stems of a mixture.
+
+        Parameters
+        ----------
+        n_percussive : int
+            number of percussive stems, including the base stem
+        n_harmonic : int
+            number of harmonic stems, including the base stem
+        rng : np.random.Generator, int or None
+            random generator (or seed) used to draw the stems
+        base_stem : str or None
+            name of the base stem. if provided, it's used in addition to
+            `n_percussive` and `n_harmonic` stems
+
+        Returns
+        -------
+        stems : list[dict]
+            metadata of the selected stems. the base stem comes first
+        base_tempo : int
+            tempo_bin from the base stem
+        """
+        rng = np.random.default_rng(rng)
+
+        if base_stem is not None:
+            base_id = self._id(base_stem)
+        else:
+            base_instruments = self.base_instruments(n_harmonic, n_percussive)
+            if len(base_instruments) == 0:
+                raise ValueError(
+                    f"No tempo bin can provide {n_harmonic} harmonic and "
+                    f"{n_percussive} percussive stems"
+                )
+            tempo_choices = list(base_instruments)
+            tempo = tempo_choices[rng.integers(len(tempo_choices))]
+
+            if n_percussive > 0:
+                n_percussive -= 1
+                base_class = "percussive"
+            else:
+                n_harmonic -= 1
+                base_class = "harmonic"
+
+            candidates = self._candidates(
+                [tempo], base_class, instruments=base_instruments[tempo]
+            )
+            base_id = _draw(candidates, 1, rng)[0]
+
+        base = self._stems([base_id])[0]
+        base_tempo = base["tempo_bin"]
+        tempo_octaves = [int(i * base_tempo) for i in TEMPO_OCTAVES]
+
+        instrument = base.get("instrument_name")
+        instrument = None if is_missing(instrument) else instrument
+
+        ids = []
+        for sound_class, n in [("percussive", n_percussive), ("harmonic", n_harmonic)]:
+            if n > 0:
+                candidates = self._candidates(tempo_octaves, sound_class, instrument)
+                ids.extend(_draw(candidates, n, rng, exclude=base_id))
+
+        stems = [base] + (self._stems(ids) if len(ids) > 0 else [])
+
+        return stems, base_tempo
+
+
+def _draw(buckets, n, rng, exclude=None):
+    # draw `n` distinct ids from the union of the sorted `buckets` without
+    # building the union: draw positions in the concatenation and map them
+    # back
+    sizes = np.array([len(b) for b in buckets], dtype=np.int64)
+    ends = np.cumsum(sizes)
+    total = int(ends[-1]) if len(ends) > 0 else 0
+
+    excluded_position = None
+    if exclude is not None:
+        for b, ids in enumerate(buckets):
+            position = np.searchsorted(ids, exclude)
+            if position < len(ids) and ids[position] == exclude:
+                excluded_position = ends[b] - sizes[b] + position
+                total -= 1
+                break
+
+    if n > total:
+        raise ValueError(
+            f"Cannot select {n} stems, only {total} compatible stems available"
+        )
+
+    positions = rng.choice(total, size=n, replace=False)
+    if excluded_position is not None:
+        positions[positions >= excluded_position] += 1
+
+    bucket_ids = np.searchsorted(ends, positions, side="right")
+    offsets = positions - (ends[bucket_ids] - sizes[bucket_ids])
+
+    return [buckets[b][o].item() for b, o in zip(bucket_ids, offsets)]
+
+
+class StemSampler(BaseSampler):
+    r"""
+    Draw the stems of a mixture from a pre-bucketed index.
+
+    The index is split once into buckets of row positions per
+    `(tempo_bin, sound_class, instrument_name)`, so drawing the stems of a
+    mixture only touches the buckets of the compatible tempo bins instead of
+    filtering the whole index. See `BaseSampler` for the sampling rules.
+
+    Parameters
+    ----------
+    index : pd.DataFrame
+        dataframe with stems information, as returned by `mix.load_index`
+    """
+
+    def __init__(self, index):
+        self.index = index.reset_index(drop=True)
+        self._records = self.index.to_dict("records")
+        self._rows_by_name = {
+            r["stem_name"]: i for i, r in enumerate(self._records)
+        }
+
+        # (tempo_bin, sound_class) -> {instrument_name: sorted row positions}
+        self._buckets = {}
+        for i, r in enumerate(self._records):
+            if is_missing(r["tempo_bin"]) or is_missing(r["sound_class"]):
+                continue
+
+            instrument = r.get("instrument_name")
+            instrument = None if is_missing(instrument) else instrument
+
+            by_instrument = self._buckets.setdefault(
+                (r["tempo_bin"], r["sound_class"]), {}
+            )
+            by_instrument.setdefault(instrument, []).append(i)
+
+        for by_instrument in self._buckets.values():
+            for instrument, rows in by_instrument.items():
+                by_instrument[instrument] = np.array(rows, dtype=np.int64)
+
+        # counts per tempo bin, computed once for every mixture
+        super().__init__(stem_counts(self.index))
+
+    def __len__(self):
+        return len(self._records)
+
+    def _candidates(self, tempo_bins, sound_class, exclude_instrument=None,
+                    instruments=None):
+        buckets = []
+        for tempo_bin in tempo_bins:
+            by_instrument = self._buckets.get((tempo_bin, sound_class), {})
+            for instrument, rows in by_instrument.items():
+                if instruments is not None and instrument not in instruments:
+                    continue
+                if exclude_instrument is None or instrument != exclude_instrument:
+                    buckets.append(rows)
+
+        return buckets
+
+    def _stems(self, rows):
+        return [dict(self._records[i]) for i in rows]
+
+    def _id(self, stem_name):
+        return self._rows_by_name[stem_name]
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. autosummary::
+   :toctree: generated/
+
+   MetadataStore
+   StoreSampler
+"""
+import json
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from stem_mixer.sampler import BaseSampler, is_missing
+
+# extensions of the index files handled by `MetadataStore`
+STORE_FORMATS = [".sqlite", ".db"]
+# columns copied out of the metadata to be queried with an index
+INDEXED_COLUMNS = ["tempo_bin", "sound_class", "instrument_name"]
+
+
+def _clean(value):
+    # JSON serializable version of a metadata value
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        value = value.item()
+    if not isinstance(value, list) and is_missing(value):
+        return None
+
+    return value
+
+
+class MetadataStore:
+    r"""
+    Metadata of all the stems in a single SQLite file.
+
+    Every stem is a row with its whole metadata as JSON, plus copies of
+    `tempo_bin`, `sound_class` and `instrument_name` in indexed columns, so
+    stems can be selected without loading the whole index.
+
+    Parameters
+    ----------
+    path : str
+        SQLite file. created if it doesn't exist
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS stems ("
+            "stem_name TEXT PRIMARY KEY, "
+            "tempo_bin INTEGER, "
+            "sound_class TEXT, "
+            "instrument_name TEXT, "
+            "metadata TEXT NOT NULL)"
+        )
+        for column in INDEXED_COLUMNS:
+            self._connection.execute(
+                f"CREATE INDEX IF NOT EXISTS stems_{column} ON stems ({column})"
+            )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS stems_bucket ON stems "
+            "(sound_class, tempo_bin, stem_name)"
+        )
+        self._connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+    def __len__(self):
+        return self._connection.execute("SELECT COUNT(*) FROM stems").fetchone()[0]
+
+    def __contains__(self, stem_name):
+        row = self._connection.execute(
+            "SELECT 1 FROM stems WHERE stem_name = ?", (stem_name,)
+        ).fetchone()
+        return row is not None
+
+    def close(self):
+        r"""
+        Close the store file.
+        """
+        self._connection.close()
+
+    def put_many(self, stems):
+        r"""
+        Insert or replace the metadata of several stems in one transaction.
+
+        Parameters
+        ----------
+        stems : list[dict]
+            metadata of every stem, with at least `stem_name`
+        """
+        rows = []
+        for stem in stems:
+            stem = {key: _clean(value) for key, value in stem.items()}
+            tempo_bin = stem.get("tempo_bin")
+            rows.append(
+                (
+                    stem["stem_name"],
+                    None if tempo_bin is None else int(tempo_bin),
+                    stem.get("sound_class"),
+                    stem.get("instrument_name"),
+                    json.dumps(stem),
+                )
+            )
+
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO stems "
+                "(stem_name, tempo_bin, sound_class, instrument_name, metadata) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def get_many(self, stem_names):
+        r"""
+        Metadata of several stems.
+
+        Parameters
+        ----------
+        stem_names : list[str]
+
+        Returns
+        -------
+        stems : list[dict]
+            in the same order as `stem_names`
+        """
+        placeholders = ",".join("?" * len(stem_names))
+        rows = self._connection.execute(
+            f"SELECT stem_name, metadata FROM stems WHERE stem_name IN ({placeholders})",
+            list(stem_names),
+        )
+        metadata = dict(rows.fetchall())
+
+        return [json.loads(metadata[name]) for name in stem_names]
+
+    def stem_names(self, tempo_bins, sound_class, exclude_instrument=None,
+                   instruments=None):
+        r"""
+        Names of the stems of a sound class in some tempo bins.
+
+        Parameters
+        ----------
+        tempo_bins : list[int]
+        sound_class : str
+        exclude_instrument : str or None
+            leave out stems of this instrument. stems without
+            `instrument_name` are always kept
+        instruments : list or None
+            only keep stems of these instruments (None for stems without
+            `instrument_name`)
+
+        Returns
+        -------
+        stem_names : list[str]
+            sorted by name
+        """
+        query = (
+            "SELECT stem_name FROM stems WHERE sound_class = ? "
+            f"AND tempo_bin IN ({','.join('?' * len(tempo_bins))})"
+        )
+        params = [sound_class] + [int(t) for t in tempo_bins]
+
+        if exclude_instrument is not None:
+            query += " AND (instrument_name IS NULL OR instrument_name != ?)"
+            params.append(exclude_instrument)
+
+        if instruments is not None:
+            names = [i for i in instruments if i is not None]
+            condition = f"instrument_name IN ({','.join('?' * len(names))})"
+            if None in instruments:
+                condition += " OR instrument_name IS NULL"
+            query += f" AND ({condition})"
+            params.extend(names)
+
+        rows = self._connection.execute(query + " ORDER BY stem_name", params)
+        return [name for name, in rows.fetchall()]
+
+    def stem_counts(self):
+        r"""
+        Number of stems per tempo bin, sound class and instrument. See
+        `sampler.stem_counts`.
+
+        Returns
+        -------
+        counts : pd.DataFrame
+            with `tempo_bin`, `sound_class`, `instrument_name` and `count`
+            columns
+        """
+        rows = self._connection.execute(
+            "SELECT tempo_bin, sound_class, instrument_name, COUNT(*) FROM stems "
+            "WHERE tempo_bin IS NOT NULL AND sound_class IS NOT NULL "
+            "GROUP BY tempo_bin, sound_class, instrument_name"
+        )
+        counts = pd.DataFrame(
+            rows.fetchall(),
+            columns=["tempo_bin", "sound_class", "instrument_name", "count"],
+        )
+        counts["instrument_name"] = counts["instrument_name"].astype(object)
+        counts.loc[counts["instrument_name"].isna(), "instrument_name"] = None
+
+        return counts
+
+    def to_dataframe(self):
+        r"""
+        Returns
+        -------
+        df : pd.DataFrame
+            metadata of every stem, sorted by `stem_name`
+        """
+        rows = self._connection.execute(
+            "SELECT metadata FROM stems ORDER BY stem_name"
+        )
+        return pd.DataFrame([json.loads(metadata) for metadata, in rows.fetchall()])
+
+
+class StoreSampler(BaseSampler):
+    r"""
+    Draw the stems of a mixture with queries to a `MetadataStore`.
+
+    Same sampling rules as `sampler.StemSampler` (see
+    `sampler.BaseSampler`), but only the counts per tempo bin are kept in
+    memory. The candidates of each draw are read from the indexed columns of
+    the store, and only the metadata of the selected stems is loaded.
+
+    The store is opened lazily by every process using the sampler, so it
+    can be sent to worker processes.
+
+    Parameters
+    ----------
+    path : str
+        path to the SQLite file of a `MetadataStore`
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._store = None
+        self._pid = None
+
+        super().__init__(self.store.stem_counts())
+        self._n_stems = len(self.store)
+
+    @property
+    def store(self):
+        # SQLite connections can't be shared with forked processes
+        if self._store is None or self._pid != os.getpid():
+            self._store = MetadataStore(self.path)
+            self._pid = os.getpid()
+        return self._store
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_store"] = None
+        return state
+
+    def __len__(self):
+        return self._n_stems
+
+    def _candidates(self, tempo_bins, sound_class, exclude_instrument=None,
+                    instruments=None):
+        names = self.store.stem_names(
+            tempo_bins, sound_class, exclude_instrument, instruments
+        )
+        return [np.array(names, dtype=str)]
+
+    def _stems(self, stem_names):
+        return self.store.get_many(stem_names)
+
+    def _id(self, stem_name):
+        return stem_name
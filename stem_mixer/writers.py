@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. autosummary::
+   :toctree: generated/
+
+   MixtureWriter
+   ShardWriter
+   atomic_write
+   stem_metadata
+"""
+import concurrent.futures
+import contextlib
+import glob
+import io
+import json
+import os
+import shutil
+import tarfile
+import threading
+import uuid
+
+import numpy as np
+import soundfile as sf
+
+# values of the stems left out of the mixture metadata: mixing internals and
+# the bookkeeping of the stem index
+EXCLUDED_METADATA = ["rms", "json_mtime_ns", "json_size"]
+
+
+@contextlib.contextmanager
+def atomic_write(path):
+    r"""
+    Write a file or a folder through a temporary path, renamed to `path`
+    once the block completes.
+
+    Readers never see a partially written `path`, and a killed run never
+    leaves one behind. The temporary path is hidden, unique, in the same
+    folder as `path`, and removed if the block raises.
+
+    Parameters
+    ----------
+    path : str
+        final path
+
+    Yields
+    ------
+    tmp_path : str
+        path to write to. nothing is created there
+
+    Examples
+    --------
+    >>> with atomic_write("metadata.json") as tmp_path:
+    ...     with open(tmp_path, "w") as f:
+    ...         json.dump(metadata, f)
+    """
+    folder, name = os.path.split(path)
+    tmp_path = os.path.join(folder, f".{name}.{uuid.uuid4().hex}.tmp")
+
+    try:
+        yield tmp_path
+    except BaseException:
+        if os.path.isdir(tmp_path):
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        elif os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    os.replace(tmp_path, path)
+
+
+def stem_metadata(stem):
+    r"""
+    Metadata of a stem saved along with a mixture.
+
+    Audio buffers and the keys of ``EXCLUDED_METADATA`` are left out, and
+    NumPy scalars are converted to python numbers.
+
+    Parameters
+    ----------
+    stem : dict
+        stem used to create a mixture
+
+    Returns
+    -------
+    metadata : dict
+    """
+    return {
+        k: v.item() if isinstance(v, np.generic) else v
+        for k, v in stem.items()
+        if not isinstance(v, np.ndarray) and k not in EXCLUDED_METADATA
+    }
+
+
+class MixtureWriter:
+    r"""
+    Run a save function in background threads, so the next mixture can be
+    computed while the previous ones are written to disk.
+
+    At most `max_pending` mixtures are queued: `submit` blocks when the
+    disk can't keep up, which bounds the memory used by queued audio.
+
+    Parameters
+    ----------
+    save_fn : callable
+        function that writes a single mixture, e.g. `mix.save_mixture`
+        with the output folder already bound
+    threads : int
+        number of writer threads. if 0, `submit` writes synchronously
+    max_pending : int or None
+        maximum number of queued mixtures. if None, 2 per thread
+    """
+
+    def __init__(self, save_fn, threads=2, max_pending=None):
+        self.save_fn = save_fn
+        self.threads = threads
+
+        if max_pending is None:
+            max_pending = 2 * max(threads, 1)
+
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._futures = []
+        self._executor = None
+
+        if threads > 0:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=threads, thread_name_prefix="stem_mixer_writer"
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+    def submit(self, *args, **kwargs):
+        r"""
+        Queue a mixture to be written with `save_fn(*args, **kwargs)`.
+
+        Errors from previous writes are raised here, so a failing disk stops
+        the generation early.
+        """
+        if self._executor is None:
+            self.save_fn(*args, **kwargs)
+            return
+
+        self._raise_errors()
+        self._slots.acquire()
+
+        future = self._executor.submit(self.save_fn, *args, **kwargs)
+        future.add_done_callback(lambda _: self._slots.release())
+        self._futures.append(future)
+
+    def close(self):
+        r"""
+        Wait for all queued mixtures to be written.
+        """
+        if self._executor is None:
+            return
+
+        self._executor.shutdown(wait=True)
+        self._raise_errors()
+
+    def _raise_errors(self):
+        pending = []
+
+        for future in self._futures:
+            if not future.done():
+                pending.append(future)
+            elif future.exception() is not None:
+                raise future.exception()
+
+        self._futures = pending
+
+
+class ShardWriter:
+    r"""
+    Pack mixtures and their stems into fixed-size tar shards.
+
+    Shards follow the WebDataset layout: every file of a mixture shares the
+    mixture id as prefix (``<id>.mixture.wav``, ``<id>.stem0.wav``, ...,
+    ``<id>.json``), so each mixture can be read back as one sample while
+    streaming a shard sequentially. Next to every ``shard-XXXXXX.tar`` a
+    ``shard-XXXXXX.json`` manifest lists the mixtures it contains.
+
+    Shards are written to a temporary file and renamed when complete.
+    Shards already in `output_folder` are kept: new shards are numbered
+    after them, and `mixture_ids` lists the mixtures they contain.
+
+    Parameters
+    ----------
+    output_folder : str
+        folder where shards are saved
+    shard_size : int
+        number of mixtures per shard
+    sr : int
+        sampling rate of the audio
+    """
+
+    def __init__(self, output_folder, shard_size=1000, sr=22050):
+        self.output_folder = output_folder
+        self.shard_size = shard_size
+        self.sr = sr
+
+        os.makedirs(output_folder, exist_ok=True)
+
+        # a manifest is written once its shard is complete
+        self.mixture_ids = set()
+        self.n_shards = 0
+        for manifest_path in glob.glob(os.path.join(output_folder, "shard-*.json")):
+            with open(manifest_path) as f:
+                self.mixture_ids.update(m["id"] for m in json.load(f)["mixtures"])
+
+            # shard-XXXXXX.json
+            index = int(os.path.basename(manifest_path)[len("shard-"):-len(".json")])
+            self.n_shards = max(self.n_shards, index + 1)
+
+        self._tar = None
+        self._manifest = None
+        self._tmp_shard = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+    def write(self, mixture, stems, mixture_id):
+        r"""
+        Add a mixture to the current shard, starting a new shard if needed.
+
+        Parameters
+        ----------
+        mixture : np.array
+            mixture audio
+        stems : list[dict]
+            stems used to create the mixture, with their aligned `audio`
+        mixture_id : str
+            name of the mixture, must not contain dots
+
+        Returns
+        -------
+        bytes_written : int
+            size of the tar entries of the mixture
+        """
+        if self._tar is None:
+            self._open_shard()
+
+        start = self._tar.offset
+
+        self._add(f"{mixture_id}.mixture.wav", self._encode(mixture))
+
+        stems_metadata = []
+        for i, s in enumerate(stems):
+            self._add(f"{mixture_id}.stem{i}.wav", self._encode(s["audio"]))
+            # same metadata as the sidecar written by `mix.save_mixture`
+            stems_metadata.append(stem_metadata(s))
+
+        self._add(f"{mixture_id}.json", json.dumps(stems_metadata).encode("utf-8"))
+
+        self._manifest["mixtures"].append(
+            {"id": mixture_id, "stems": [s["stem_name"] for s in stems]}
+        )
+        bytes_written = self._tar.offset - start
+
+        if len(self._manifest["mixtures"]) >= self.shard_size:
+            self._close_shard()
+
+        return bytes_written
+
+    def close(self):
+        r"""
+        Finish the current shard.
+        """
+        if self._tar is not None:
+            self._close_shard()
+
+    def _shard_path(self, index):
+        return os.path.join(self.output_folder, f"shard-{index:06d}")
+
+    def _open_shard(self):
+        self._tmp_shard = contextlib.ExitStack()
+        tmp_path = self._tmp_shard.enter_context(
+            atomic_write(self._shard_path(self.n_shards) + ".tar")
+        )
+
+        self._tar = tarfile.open(tmp_path, "w")
+        self._manifest = {
+            "shard": f"shard-{self.n_shards:06d}.tar",
+            "sr": self.sr,
+            "mixtures": [],
+        }
+
+    def _close_shard(self):
+        self._tar.close()
+        self._tmp_shard.close()
+
+        with atomic_write(self._shard_path(self.n_shards) + ".json") as tmp_path:
+            with open(tmp_path, "w") as f:
+                json.dump(self._manifest, f)
+
+        self._tar = None
+        self._manifest = None
+        self._tmp_shard = None
+        self.n_shards += 1
+
+    def _encode(self, audio):
+        buffer = io.BytesIO()
+        sf.write(buffer, audio, self.sr, format="WAV")
+        return buffer.getvalue()
+
+    def _add(self, name, data):
+        # fixed metadata so the same mixtures always produce the same shards
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = 0
+        info.mode = 0o644
+        self._tar.addfile(info, io.BytesIO(data))
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+import soundfile as sf
+
+from stem_mixer.metadata import dict_template
+
+
+@pytest.fixture
+def data_home(tmp_path):
+    sr = 22050
+    t = np.arange(4 * sr) / sr
+    rows = []
+
+    for i, (sound_class, tempo) in enumerate(
+        [("percussive", 120), ("percussive", 120), ("harmonic", 120),
+         ("harmonic", 60), ("percussive", 60)]
+    ):
+        # clicks for percussive stems, one note per beat for harmonic stems
+        envelope = np.zeros_like(t)
+        period = int(60 / tempo * sr)
+        decay = 200 if sound_class == "percussive" else period
+        for start in range(0, len(t), period):
+            envelope[start:start + decay] = np.exp(-np.arange(decay) / (decay / 4))[
+                :len(t) - start]
+
+        if sound_class == "percussive":
+            y = envelope * np.random.default_rng(i).uniform(-1, 1, len(t))
+        else:
+            y = 0.5 * envelope * np.sin(2 * np.pi * 220 * (i + 1) * t)
+
+        stem = dict_template(str(tmp_path), f"stem{i}.wav")
+        stem.update(
+            tempo=float(tempo), sound_class=sound_class, tempo_bin=tempo,
+            instrument_name=f"instrument{i}"
+        )
+        sf.write(tmp_path / stem["stem_name"], y, sr)
+        rows.append(stem)
+
+    pd.DataFrame(rows).to_csv(tmp_path / "index.csv", index=False)
+
+    return tmp_path
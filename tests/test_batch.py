@@ -0,0 +1,60 @@
+import librosa
+import numpy as np
+import pytest
+
+from stem_mixer.batch import apply_stretch, first_beat_times, pad_stack, rms, stretch_batch
+
+
+def test_pad_stack():
+    batch, lengths = pad_stack([np.ones(3, dtype=np.float32), np.ones(5, dtype=np.float32)])
+
+    assert batch.shape == (2, 5)
+    assert batch.dtype == np.float32
+    np.testing.assert_array_equal(lengths, [3, 5])
+    np.testing.assert_array_equal(batch[0], [1, 1, 1, 0, 0])
+
+
+@pytest.mark.parametrize("method", ["phase_vocoder", "resample"])
+def test_stretch_batch_matches_single(method):
+    rng = np.random.default_rng(0)
+    audios = [rng.uniform(-1, 1, n).astype(np.float32) for n in [22050, 22050, 30000, 11025]]
+    rates = [2.0, 2.0, 2.0, 1.0]
+    methods = [method, method, method, "identity"]
+
+    stretched = stretch_batch(audios, rates, methods)
+
+    # bit-exact, whatever the other signals of the batch
+    for audio, rate, m, s in zip(audios, rates, methods, stretched):
+        np.testing.assert_array_equal(s, apply_stretch(audio, rate, method=m))
+
+
+def test_first_beat_times():
+    sr = 22050
+    audios = []
+    for start, seconds in [(0.5, 4), (1.0, 4)]:
+        clicks = librosa.clicks(
+            times=np.arange(start, seconds, 0.5), sr=sr, length=seconds * sr
+        )
+        audios.append(clicks)
+
+    np.testing.assert_allclose(first_beat_times(audios, sr), [0.5, 1.0], atol=0.05)
+
+
+def test_first_beat_times_ignores_batch_partners():
+    sr = 22050
+    t = np.arange(6 * sr) / sr
+    beat = np.mod(t, 60 / 140)
+    short = np.exp(-beat * 8) * np.sin(2 * np.pi * 440 * t)
+    short[: int(0.1 * sr)] = 0
+    long = librosa.clicks(times=np.arange(0.5, 20, 0.6), sr=sr, length=20 * sr)
+
+    np.testing.assert_array_equal(
+        first_beat_times([short, long], sr)[:1], first_beat_times([short], sr)
+    )
+
+
+def test_rms():
+    audios = [np.ones(10), np.full(5, 2.0)]
+
+    np.testing.assert_allclose(rms(audios), [1.0, 2.0])
+    np.testing.assert_allclose(rms(audios, offsets=[0, 15]), [1.0, 1.0])
@@ -0,0 +1,29 @@
+import numpy as np
+
+from stem_mixer.cache import AudioCache
+
+
+def test_lru_eviction():
+    audio = np.zeros(100, dtype=np.float32)
+    cache = AudioCache(max_bytes=2 * audio.nbytes)
+
+    cache.put("a", audio.copy())
+    cache.put("b", audio.copy())
+    cache.get("a")
+    cache.put("c", audio.copy())
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats["hits"] == 3
+    assert cache.stats["misses"] == 1
+    assert cache.stats["nbytes"] == 2 * audio.nbytes
+
+
+def test_disk_tier(tmp_path):
+    audio = np.arange(10, dtype=np.float32)
+    AudioCache(cache_dir=str(tmp_path)).put(("stem.wav", 22050, 2.0, 5.0), audio)
+
+    cache = AudioCache(max_bytes=0, cache_dir=str(tmp_path))
+    np.testing.assert_array_equal(cache.get(("stem.wav", 22050, 2.0, 5.0)), audio)
+    assert cache.stats["disk_hits"] == 1
@@ -0,0 +1,95 @@
+import os
+
+import librosa
+import numpy as np
+import pytest
+import soundfile as sf
+
+from stem_mixer import features
+
+STEM_PATH = os.path.join(os.path.dirname(__file__), "[0257] S2-SK2-01-SA.wav")
+
+
+def test_extract_matches_single_features():
+    y, sr = librosa.load(STEM_PATH, sr=22050, mono=True)
+    expected_tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
+    harmonic, percussive = librosa.effects.hpss(y)
+
+    values = features.extract(STEM_PATH, ["tempo", "sound_class"])
+
+    assert values["tempo"] == pytest.approx(float(np.atleast_1d(expected_tempo)[0]))
+    analysis = features.Analysis(y, sr)
+    np.testing.assert_allclose(analysis.hpss[0], harmonic)
+    np.testing.assert_allclose(analysis.hpss[1], percussive)
+    assert values["sound_class"] == features._sound_class(analysis)
+
+
+def test_extract_unknown_feature():
+    with pytest.raises(ValueError):
+        features.extract(STEM_PATH, ["loudness"])
+
+
+@pytest.mark.parametrize("expected", ["percussive", "harmonic"])
+def test_sound_class_fast_agrees(tmp_path, expected):
+    sr = 22050
+    t = np.arange(20 * sr) / sr
+    beat = np.mod(t, 0.5)
+
+    if expected == "percussive":
+        y = np.exp(-beat * 200) * np.random.default_rng(0).uniform(-1, 1, len(t))
+    else:
+        y = np.exp(-beat * 8) * np.sin(2 * np.pi * 220 * t)
+
+    stem_path = str(tmp_path / "stem.wav")
+    sf.write(stem_path, 0.5 * y, sr)
+
+    assert features.sound_class(stem_path, mode="accurate") == expected
+    assert features.sound_class(stem_path, mode="fast") == expected
+
+
+def test_extract_unknown_mode():
+    with pytest.raises(ValueError):
+        features.extract(STEM_PATH, ["sound_class"], modes={"sound_class": "rough"})
+
+    with pytest.raises(ValueError):
+        features.extract(STEM_PATH, ["trim_start"], modes={"trim_start": "fast"})
+
+
+def test_tempo_fast():
+    expected = features.tempo(STEM_PATH)
+    tempo, confidence = features.tempo(STEM_PATH, mode="fast", confidence=True)
+
+    assert tempo == pytest.approx(expected, rel=features.TEMPO_TOLERANCE)
+    assert 0 < confidence <= 1
+
+    names = ["first_beat"]
+    accurate = features.extract(STEM_PATH, names)["first_beat"]
+    fast = features.extract(STEM_PATH, names, modes={"first_beat": "fast"})["first_beat"]
+    assert fast == pytest.approx(accurate, abs=0.05)
+
+
+@pytest.mark.parametrize("seconds", [5.0, 0.3])
+@pytest.mark.parametrize("mode", features.MODES)
+def test_tempo_confidence_without_reliable_tempo(tmp_path, mode, seconds):
+    sr = 22050
+    stem_path = str(tmp_path / "stem.wav")
+    # silent stem, or a noise burst shorter than the tempogram window
+    y = np.random.default_rng(0).uniform(-1, 1, int(seconds * sr))
+    if seconds > 1:
+        y[:] = 0
+    sf.write(stem_path, y, sr)
+
+    _, confidence = features.tempo(stem_path, mode=mode, confidence=True)
+    assert confidence == 0
+
+
+def test_tempo_confidence_of_known_tempo():
+    tempo = features.tempo(STEM_PATH)
+    values = features.extract(STEM_PATH, ["tempo_confidence"], known={"tempo": tempo})
+    assert values["tempo_confidence"] > 0
+
+    # measured against the given tempo, not the estimated one
+    values = features.extract(
+        STEM_PATH, ["tempo_confidence"], known={"tempo": tempo * 1.5}
+    )
+    assert values["tempo_confidence"] == 0
@@ -0,0 +1,23 @@
+import pytest
+
+from stem_mixer.journal import Journal
+
+
+def test_journal(tmp_path):
+    path = str(tmp_path / "journal.sqlite")
+
+    with Journal(path) as journal:
+        journal.add(["a.wav", "b.wav", "c.wav"])
+        journal.update("a.wav", "done")
+        journal.update("b.wav", "failed", "corrupt file")
+        # stems already in the journal keep their status
+        journal.add(["a.wav"])
+
+    with Journal(path) as journal:
+        assert journal.status() == {"a.wav": "done", "b.wav": "failed", "c.wav": "pending"}
+        assert journal.status(["c.wav", "d.wav"]) == {"c.wav": "pending"}
+        assert journal.failed() == [("b.wav", "corrupt file")]
+        assert journal.counts() == {"pending": 1, "done": 1, "failed": 1}
+
+        with pytest.raises(ValueError):
+            journal.update("a.wav", "running")
@@ -0,0 +1,215 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+import soundfile as sf
+
+from stem_mixer import features, metadata
+from stem_mixer.journal import Journal
+
+
+def write_click_track(path, bpm=120, seconds=4.0, sr=22050):
+    y = np.zeros(int(seconds * sr), dtype=np.float32)
+    period = int(60 / bpm * sr)
+    for start in range(0, len(y), period):
+        y[start:start + 200] = np.hanning(400)[200:]
+    sf.write(path, y, sr)
+
+
+def test_process_isolates_failures(tmp_path):
+    write_click_track(tmp_path / "clicks.wav")
+    (tmp_path / "corrupt.wav").write_bytes(b"not a wav file")
+
+    metadata.process(str(tmp_path), workers=2)
+
+    assert os.path.exists(tmp_path / "clicks.json")
+    assert not os.path.exists(tmp_path / "corrupt.json")
+
+    with open(tmp_path / "clicks.json") as f:
+        assert json.load(f)["tempo"] is not None
+
+
+def test_process_profile(tmp_path):
+    write_click_track(tmp_path / "clicks.wav")
+
+    metadata.process(str(tmp_path), workers=2, profile=str(tmp_path / "profile.json"))
+
+    with open(tmp_path / "profile.json") as f:
+        summary = json.load(f)
+
+    assert {"decode", "tempo", "hpss", "write"} <= set(summary)
+    assert summary["decode"]["bytes_read"] > 0
+
+
+def test_process_fast_modes(tmp_path):
+    write_click_track(tmp_path / "clicks.wav")
+
+    metadata.process(str(tmp_path), sound_class_mode="fast", tempo_mode="fast")
+
+    with open(tmp_path / "clicks.json") as f:
+        stem = json.load(f)
+
+    assert stem["tempo"] is not None
+    assert 0 <= stem["tempo_confidence"] <= 1
+    assert stem["first_beat"] >= stem["trim_start"]
+
+
+def test_process_resumes_from_journal(tmp_path, monkeypatch):
+    for name in ["done.wav", "interrupted.wav", "old.wav"]:
+        write_click_track(tmp_path / name)
+    (tmp_path / "corrupt.wav").write_bytes(b"not a wav file")
+
+    metadata.process(str(tmp_path))
+
+    with Journal(str(tmp_path / "journal.sqlite")) as journal:
+        assert journal.counts() == {"pending": 0, "done": 3, "failed": 1}
+        # simulate a run killed while writing a stem
+        journal.update("interrupted.wav", "pending")
+    (tmp_path / "interrupted.json").write_text('{"tempo": 12')
+
+    processed = []
+    extract = features.extract
+
+    def spy(stem_path, *args, **kwargs):
+        processed.append(os.path.basename(stem_path))
+        return extract(stem_path, *args, **kwargs)
+
+    monkeypatch.setattr("stem_mixer.features.extract", spy)
+    metadata.process(str(tmp_path))
+
+    # done stems are skipped and failed ones aren't retried
+    assert processed == ["interrupted.wav"]
+    with open(tmp_path / "interrupted.json") as f:
+        assert json.load(f)["tempo"] is not None
+
+    processed.clear()
+    metadata.process(str(tmp_path), retry_failed=True)
+    assert processed == ["corrupt.wav"]
+
+
+def test_extract_stems_exhausts_results(tmp_path, monkeypatch):
+    write_click_track(tmp_path / "clicks.wav")
+    finished = []
+    imap = metadata.parallel.imap
+
+    def spy(*args, **kwargs):
+        yield from imap(*args, **kwargs)
+        finished.append(True)
+
+    monkeypatch.setattr("stem_mixer.parallel.imap", spy)
+    metadata.extract_stems([(str(tmp_path), "clicks.wav", None)])
+
+    assert finished == [True]
+
+
+def test_process_to_store(tmp_path):
+    write_click_track(tmp_path / "clicks.wav")
+    (tmp_path / "corrupt.wav").write_bytes(b"not a wav file")
+
+    metadata.process(str(tmp_path), workers=2, index_file="index.sqlite")
+
+    assert not os.path.exists(tmp_path / "clicks.json")
+    index = metadata.read_index(str(tmp_path / "index.sqlite"))
+    assert list(index["stem_name"]) == ["clicks.wav"]
+    assert index["tempo"][0] is not None
+
+
+def test_process_switching_backend(tmp_path):
+    write_click_track(tmp_path / "clicks.wav")
+
+    metadata.process(str(tmp_path))
+    # done in the journal, but not in the store yet
+    metadata.process(str(tmp_path), index_file="index.sqlite")
+    index = metadata.read_index(str(tmp_path / "index.sqlite"))
+    assert list(index["stem_name"]) == ["clicks.wav"]
+
+    os.remove(tmp_path / "clicks.json")
+    metadata.process(str(tmp_path))
+    assert os.path.exists(tmp_path / "clicks.json")
+    index = metadata.read_index(str(tmp_path / "index.csv"))
+    assert list(index["stem_name"]) == ["clicks.wav"]
+
+
+def test_process_with_cache_dir(tmp_path):
+    data_home = tmp_path / "stems"
+    cache_dir = tmp_path / "cache"
+    data_home.mkdir()
+    write_click_track(data_home / "clicks.wav", sr=44100)
+
+    metadata.process(str(data_home), cache_dir=str(cache_dir))
+
+    with open(data_home / "clicks.json") as f:
+        cached_path = json.load(f)["cached_path"]
+
+    info = sf.info(cached_path)
+    assert info.samplerate == metadata.MIX_SR
+    assert info.subtype == "FLOAT"
+
+
+def test_save_stem_dataframe_is_incremental(tmp_path, monkeypatch):
+    for i in range(3):
+        stem = metadata.dict_template(str(tmp_path), f"stem{i}.wav")
+        stem["tempo"] = 100.0 + i
+        with open(tmp_path / f"stem{i}.json", "w") as f:
+            json.dump(stem, f)
+
+    assert len(metadata.save_stem_dataframe(str(tmp_path))) == 3
+
+    os.remove(tmp_path / "stem0.json")
+    stem = metadata.dict_template(str(tmp_path), "stem3.wav")
+    stem["tempo"] = 90.0
+    with open(tmp_path / "stem3.json", "w") as f:
+        json.dump(stem, f)
+
+    parsed = []
+    json_load = json.load
+    monkeypatch.setattr(json, "load", lambda f: parsed.append(f.name) or json_load(f))
+
+    df = metadata.save_stem_dataframe(str(tmp_path))
+
+    assert parsed == [str(tmp_path / "stem3.json")]
+    assert list(df["stem_name"]) == ["stem1.wav", "stem2.wav", "stem3.wav"]
+    assert list(df["tempo"]) == [101.0, 102.0, 90.0]
+
+
+@pytest.mark.parametrize("index_file", [
+    "index.csv", "index.npz", "index.parquet", "index.feather", "index.sqlite"
+])
+def test_index_formats(tmp_path, index_file):
+    if os.path.splitext(index_file)[1] in metadata.ARROW_FORMATS:
+        pytest.importorskip("pyarrow")
+
+    df = pd.DataFrame({
+        "stem_name": ["a.wav", "b.wav", "c.wav"],
+        "tempo": [120.0, np.nan, 61.5],
+        "tempo_bin": [120, 60, 65],
+        "key": [None, None, None],
+        "sound_class": ["percussive", None, "harmonic"],
+        "segments": [[0.5, 1.0], None, []],
+    })
+
+    metadata.write_index(df, str(tmp_path / index_file))
+    index = metadata.read_index(str(tmp_path / index_file))
+
+    assert list(index["stem_name"]) == ["a.wav", "b.wav", "c.wav"]
+    np.testing.assert_array_equal(index["tempo"], df["tempo"])
+    assert index["tempo_bin"].dtype == np.int64
+    assert list(index["segments"][[0, 2]]) == [[0.5, 1.0], []]
+    assert index["segments"][1] is None
+
+
+def test_index_format_without_pyarrow(tmp_path, monkeypatch):
+    # a None entry makes `import pyarrow` raise ImportError
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+
+    with pytest.raises(ImportError, match="pyarrow"):
+        metadata.write_index(pd.DataFrame({"a": [1]}), str(tmp_path / "index.parquet"))
+    assert not os.path.exists(tmp_path / "index.parquet.tmp")
+
+
+def test_index_format_unsupported(tmp_path):
+    with pytest.raises(ValueError):
+        metadata.read_index(str(tmp_path / "index.xlsx"))
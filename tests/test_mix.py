@@ -1,12 +1,21 @@
+import json
+import os
+import shutil
+import tarfile
+
 import pytest
 
+import librosa
 import numpy as np
 
-from stem_mixer.mix import normalize
+from stem_mixer import metadata
+from stem_mixer.mix import (
+    first_beat_time, generate_mixtures, load_audio, load_index, mix, normalize,
+    stretch_audio, time_stretch
+)
 from stem_mixer.metadata import dict_template
 
 
-
 def test_normalize():
     s1 = dict_template("data_home", "track1")
     s1["audio"] = np.ones(10)
@@ -22,6 +31,256 @@ def test_normalize():
     stems = normalize(stems)
 
     for s in stems:
-        np.testing.assert_allclose(s["audio"], np.ones(10), rtol=1e-8, atol=0)
+        np.testing.assert_allclose(s["audio"] * s["gain"], np.ones(10), rtol=1e-8,
+                                   atol=0)
 
     return
+
+
+def test_mix_applies_offset_and_gain():
+    s1 = dict_template("data_home", "track1")
+    s1.update(audio=np.ones(10, dtype=np.float32), offset=0, gain=0.5)
+
+    s2 = dict_template("data_home", "track2")
+    s2.update(audio=np.ones(10, dtype=np.float32) * 2, offset=4, gain=1.0)
+
+    mixture, stems = mix(1.0, [s1, s2], sr=8)
+
+    assert mixture.dtype == np.float32
+    np.testing.assert_allclose(stems[0]["audio"], [0.5] * 8)
+    np.testing.assert_allclose(stems[1]["audio"], [0, 0, 0, 0, 2, 2, 2, 2])
+    np.testing.assert_allclose(mixture, [0.5] * 4 + [2.5] * 4)
+
+
+def test_generate_mixtures(data_home):
+    output_folder = data_home / "mixtures"
+
+    generate_mixtures(str(data_home), 3, 2, 1, 1, 2.0,
+                      output_folder=str(output_folder), cache_size=2**20)
+
+    assert len(list(output_folder.glob("*.json"))) == 3
+    # no temporary folders are left behind
+    assert len(list(output_folder.glob(".*"))) == 0
+
+
+def test_generate_mixtures_is_deterministic(data_home):
+    outputs = []
+    # cache hits change which stems are stretched together
+    for workers, cache_size in [(1, 0), (2, 0), (1, 2**28), (2, 2**28)]:
+        output_folder = data_home / f"mixtures_{workers}_{cache_size}"
+        generate_mixtures(str(data_home), 4, 2, 1, 1, 2.0,
+                          output_folder=str(output_folder), seed=42,
+                          workers=workers, cache_size=cache_size)
+        outputs.append({
+            path.relative_to(output_folder): path.read_bytes()
+            for path in output_folder.rglob("*") if path.is_file()
+        })
+
+    assert len(outputs[0]) > 0
+    for output in outputs[1:]:
+        assert output == outputs[0]
+
+
+def test_generate_mixtures_resumes(data_home):
+    output_folder = data_home / "mixtures"
+
+    generate_mixtures(str(data_home), 3, 2, 1, 1, 2.0,
+                      output_folder=str(output_folder), seed=0)
+    mixtures = sorted(p.name for p in output_folder.glob("*.json"))
+    expected = (output_folder / mixtures[1]).read_bytes()
+
+    # an interrupted run: one mixture is missing
+    shutil.rmtree(output_folder / mixtures[1][:-len(".json")])
+    os.remove(output_folder / mixtures[1])
+
+    # mixtures already saved are skipped instead of raising FileExistsError
+    generate_mixtures(str(data_home), 3, 2, 1, 1, 2.0,
+                      output_folder=str(output_folder), seed=0)
+
+    assert sorted(p.name for p in output_folder.glob("*.json")) == mixtures
+    assert (output_folder / mixtures[1]).read_bytes() == expected
+
+
+def test_generate_mixtures_without_eligible_tempo_bin(data_home):
+    output_folder = data_home / "mixtures"
+
+    with pytest.raises(ValueError):
+        generate_mixtures(str(data_home), 2, 6, 3, 3, 2.0,
+                          output_folder=str(output_folder), seed=0)
+
+    assert not output_folder.exists()
+
+
+def test_generate_mixtures_raises_on_failed_mixtures(data_home):
+    # every mixture has a percussive stem
+    for i in [0, 1, 4]:
+        os.remove(data_home / f"stem{i}.wav")
+
+    with pytest.raises(RuntimeError):
+        generate_mixtures(str(data_home), 4, 2, 1, 1, 2.0,
+                          output_folder=str(data_home / "mixtures"), seed=0)
+
+
+def test_generate_mixtures_profile(data_home):
+    profile = data_home / "profile.json"
+
+    generate_mixtures(str(data_home), 2, 2, 1, 1, 2.0,
+                      output_folder=str(data_home / "mixtures"), seed=0,
+                      workers=2, profile=str(profile))
+
+    with open(profile) as f:
+        summary = json.load(f)
+
+    for name in ["select", "load", "trim", "stretch", "beat", "normalize", "mix", "save"]:
+        assert summary[name]["count"] >= 2
+
+    # bytes are the sizes on disk
+    written = sum(
+        path.stat().st_size for path in (data_home / "mixtures").rglob("*") if path.is_file()
+    )
+    assert summary["save"]["bytes_written"] == written
+    assert summary["load"]["bytes_read"] > 0
+
+
+def test_generate_mixtures_from_store(data_home):
+    metadata.write_index(load_index(str(data_home)), str(data_home / "index.sqlite"))
+
+    output_folder = data_home / "mixtures"
+    generate_mixtures(str(data_home), 2, 2, 1, 1, 2.0, index_file="index.sqlite",
+                      output_folder=str(output_folder), seed=0, workers=2)
+
+    assert len(list(output_folder.glob("*.json"))) == 2
+
+
+def test_first_beat_time_from_metadata(monkeypatch):
+    def beat_track(*args, **kwargs):
+        raise AssertionError("beat tracking should not run")
+
+    monkeypatch.setattr("librosa.beat.beat_track", beat_track)
+
+    stem = dict_template("data_home", "track1")
+    stem.update(first_beat=0.5, trim_start=0.25, stretch_rate=2.0)
+
+    assert first_beat_time(stem) == pytest.approx(0.125)
+
+
+def test_time_stretch_loads_needed_span(data_home, monkeypatch):
+    spans = {}
+
+    def fake_load_audio(audio_path, sr=22050, offset=0.0, duration=None):
+        spans[os.path.basename(audio_path)] = duration
+        return np.zeros(int(duration * sr), dtype=np.float32)
+
+    monkeypatch.setattr("stem_mixer.mix.load_audio", fake_load_audio)
+
+    stems = []
+    for name, tempo, first_beat in [("stem0.wav", 120.0, 0.5), ("stem3.wav", 60.0, 0.1)]:
+        stem = dict_template(str(data_home), name)
+        stem.update(tempo=tempo, first_beat=first_beat, trim_start=0.0, trim_end=30.0)
+        stems.append(stem)
+
+    time_stretch(stems, 120.0, duration=3.0)
+
+    # stem3 is stretched 2x faster, its first beat lands at 0.05s, 0.45s
+    # before stem0's, so it only has to fill 2.55s of the mixture
+    assert spans == {"stem0.wav": 3.5, "stem3.wav": 5.5}
+    assert [s["stretch_rate"] for s in stems] == [1.0, 2.0]
+
+
+def test_generate_mixtures_with_beat_grid(data_home):
+    index = load_index(str(data_home))
+
+    for stem in index.to_dict("records"):
+        metadata.feature_extraction(str(data_home), stem["stem_name"], stem)
+    metadata.save_stem_dataframe(str(data_home))
+
+    index = load_index(str(data_home))
+    assert index["first_beat"].dtype == np.float64
+
+    output_folder = data_home / "mixtures"
+    generate_mixtures(str(data_home), 2, 2, 1, 1, 2.0,
+                      output_folder=str(output_folder), seed=0)
+
+    sidecars = list(output_folder.glob("*.json"))
+    assert len(sidecars) == 2
+    with open(sidecars[0]) as f:
+        stems = json.load(f)
+    # bookkeeping of the index isn't copied to the mixtures
+    assert "first_beat" in stems[0] and "json_size" not in stems[0]
+
+
+@pytest.mark.parametrize("sr", [22050, 44100])
+def test_load_audio_matches_librosa(sr):
+    stem_path = os.path.join(os.path.dirname(__file__), "[0257] S2-SK2-01-SA.wav")
+
+    expected, _ = librosa.load(stem_path, sr=sr, offset=1.3, duration=5.0)
+    audio = load_audio(stem_path, sr=sr, offset=1.3, duration=5.0)
+
+    np.testing.assert_allclose(audio, expected)
+
+
+def test_generate_mixtures_tar_shards(data_home):
+    output_folder = data_home / "shards"
+
+    generate_mixtures(str(data_home), 3, 2, 1, 1, 2.0,
+                      output_folder=str(output_folder), seed=0,
+                      output_format="tar", shard_size=2)
+
+    assert sorted(p.name for p in output_folder.iterdir()) == [
+        "shard-000000.json", "shard-000000.tar",
+        "shard-000001.json", "shard-000001.tar",
+    ]
+
+    with tarfile.open(output_folder / "shard-000000.tar") as tar:
+        names = tar.getnames()
+
+    assert len(names) == 2 * 4
+    assert names[0].endswith(".mixture.wav")
+
+
+def test_generate_mixtures_tar_shards_resume(data_home):
+    output_folder = data_home / "shards"
+
+    generate_mixtures(str(data_home), 2, 2, 1, 1, 2.0,
+                      output_folder=str(output_folder), seed=0,
+                      output_format="tar", shard_size=2)
+    first_shard = (output_folder / "shard-000000.tar").read_bytes()
+
+    # the complete shard is kept, only the missing mixture is generated
+    generate_mixtures(str(data_home), 3, 2, 1, 1, 2.0,
+                      output_folder=str(output_folder), seed=0,
+                      output_format="tar", shard_size=1)
+
+    assert (output_folder / "shard-000000.tar").read_bytes() == first_shard
+    assert sorted(p.name for p in output_folder.iterdir()) == [
+        "shard-000000.json", "shard-000000.tar",
+        "shard-000001.json", "shard-000001.tar",
+    ]
+
+
+@pytest.mark.parametrize("rate, expected_rate, expected_length", [
+    (1.005, 1.0, 4000),
+    (2.01, 2.01, 1990),
+    (1.3, 1.3, 3077),
+])
+def test_stretch_audio_auto(rate, expected_rate, expected_length):
+    audio = np.random.default_rng(0).uniform(-1, 1, 4000).astype(np.float32)
+
+    stretched, applied_rate = stretch_audio(audio, rate, backend="auto")
+
+    assert applied_rate == expected_rate
+    assert abs(len(stretched) - expected_length) <= 1
+
+
+def test_stretch_audio_resample_only_at_octaves():
+    audio = np.random.default_rng(0).uniform(-1, 1, 4000).astype(np.float32)
+
+    # off an octave the pitch would be out of tune: use the phase vocoder
+    stretched, _ = stretch_audio(audio, 1.3, backend="resample")
+    expected, _ = stretch_audio(audio, 1.3, backend="phase_vocoder")
+    np.testing.assert_array_equal(stretched, expected)
+
+    stretched, _ = stretch_audio(audio, 2.0, backend="resample")
+    np.testing.assert_array_equal(
+        stretched, librosa.resample(audio, orig_sr=22050 * 2.0, target_sr=22050)
+    )
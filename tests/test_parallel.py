@@ -0,0 +1,23 @@
+import os
+import time
+
+from stem_mixer import parallel
+
+
+def touch(path):
+    # records that the job started running
+    open(path, "w").close()
+    return os.path.basename(path)
+
+
+def test_imap_bounds_pending_results(tmp_path):
+    jobs = [str(tmp_path / f"job{i}") for i in range(20)]
+
+    results = parallel.imap(touch, jobs, workers=2, chunksize=1, max_pending=3)
+    assert next(results) == ("job0", None)
+
+    # the consumer is stalled: only the chunks already submitted can run
+    time.sleep(1)
+    assert len(os.listdir(tmp_path)) <= 4
+
+    assert [result for result, _ in results] == [f"job{i}" for i in range(1, 20)]
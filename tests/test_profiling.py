@@ -0,0 +1,62 @@
+import contextlib
+import json
+
+import pandas as pd
+import pytest
+
+from stem_mixer.profiling import Profiler, stage
+
+
+def test_profiler_summary():
+    profiler = Profiler()
+
+    for i in range(4):
+        with profiler.stage("load") as record:
+            record["bytes_read"] += 10
+    with profiler.stage("mix"):
+        pass
+
+    summary = profiler.summary()
+
+    assert list(summary) == ["load", "mix"]
+    assert summary["load"]["count"] == 4
+    assert summary["load"]["bytes_read"] == 40
+    assert summary["load"]["wall_time_p50"] <= summary["load"]["wall_time_p99"]
+
+
+def test_profiler_hook():
+    calls = []
+
+    @contextlib.contextmanager
+    def hook(name):
+        calls.append(name)
+        yield
+
+    profiler = Profiler(hook=hook)
+    with profiler.stage("stretch"):
+        pass
+
+    assert calls == ["stretch"]
+
+
+def test_profiler_save(tmp_path):
+    profiler = Profiler()
+    profiler.extend([{"stage": "save", "wall_time": 1.0, "cpu_time": 0.5,
+                      "bytes_read": 0, "bytes_written": 100}])
+
+    profiler.save(str(tmp_path / "profile.json"))
+    profiler.save(str(tmp_path / "profile.csv"))
+
+    with open(tmp_path / "profile.json") as f:
+        assert json.load(f)["save"]["bytes_written"] == 100
+
+    df = pd.read_csv(tmp_path / "profile.csv", index_col="stage")
+    assert df.loc["save", "wall_time_total"] == 1.0
+
+    with pytest.raises(ValueError):
+        profiler.save(str(tmp_path / "profile.txt"))
+
+
+def test_stage_without_profiler():
+    with stage(None, "load") as record:
+        record["bytes_read"] += 1
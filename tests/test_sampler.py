@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from stem_mixer.sampler import (
+    StemSampler, eligible_base_instruments, eligible_tempo_bins, stem_counts
+)
+
+
+@pytest.fixture
+def index():
+    rng = np.random.default_rng(0)
+    n = 500
+    return pd.DataFrame({
+        "stem_name": [f"stem{i}.wav" for i in range(n)],
+        "tempo_bin": rng.choice([60, 100, 120, 240], n),
+        "sound_class": rng.choice(["percussive", "harmonic", "undetermined"], n),
+        "instrument_name": rng.choice(["drums", "bass", "guitar", None], n),
+    })
+
+
+def test_sample(index):
+    sampler = StemSampler(index)
+
+    for seed in range(50):
+        stems, base_tempo = sampler.sample(2, 2, rng=seed)
+        base, others = stems[0], stems[1:]
+
+        assert len(set(s["stem_name"] for s in stems)) == 4
+        assert base["sound_class"] == "percussive"
+        assert sorted(s["sound_class"] for s in others) == [
+            "harmonic", "harmonic", "percussive"
+        ]
+        assert all(s["tempo_bin"] in [base_tempo // 2, base_tempo, base_tempo * 2,
+                                      base_tempo * 4] for s in others)
+        if base["instrument_name"] is not None:
+            assert all(s["instrument_name"] != base["instrument_name"] for s in others)
+
+
+def test_sample_is_deterministic(index):
+    sampler = StemSampler(index)
+
+    assert sampler.sample(1, 2, rng=7) == StemSampler(index).sample(1, 2, rng=7)
+
+
+def test_sample_not_enough_stems(index):
+    sampler = StemSampler(index.iloc[:3])
+
+    with pytest.raises(ValueError):
+        sampler.sample(1, 10, base_stem="stem0.wav")
+
+
+def test_eligible_tempo_bins():
+    index = pd.DataFrame({
+        "tempo_bin": [60, 120, 120, 240, 95],
+        "sound_class": ["harmonic", "percussive", "harmonic", "harmonic", "harmonic"],
+    })
+    counts = stem_counts(index)
+
+    # 120 has one harmonic stem, but its octaves (60, 240) have two more
+    assert eligible_tempo_bins(counts, 3, 1) == [120]
+    # 95 has no octaves with stems
+    assert eligible_tempo_bins(counts, 2, 0) == [60, 120, 240]
+    assert eligible_tempo_bins(counts, 1, 2) == []
+
+
+def test_eligible_tempo_bins_excludes_base_instrument():
+    index = pd.DataFrame({
+        "stem_name": [f"stem{i}.wav" for i in range(5)],
+        "tempo_bin": [120] * 5,
+        "sound_class": ["percussive"] * 3 + ["harmonic"] * 2,
+        "instrument_name": ["drums"] * 3 + ["bass", "guitar"],
+    })
+    sampler = StemSampler(index)
+
+    # every other percussive stem shares the instrument of the base stem
+    assert sampler.tempo_bins(1, 2) == []
+    with pytest.raises(ValueError):
+        sampler.sample(2, 1, rng=0)
+
+    # same for harmonic stems
+    index.loc[4, "instrument_name"] = "bass"
+    assert eligible_base_instruments(stem_counts(index), 2, 0) == {}
+
+    # only the base stems without instrument leave enough percussive stems
+    index.loc[0, "instrument_name"] = None
+    assert eligible_base_instruments(stem_counts(index), 0, 3) == {120: [None]}
+
+    sampler = StemSampler(index)
+    for seed in range(10):
+        stems, _ = sampler.sample(3, 0, rng=seed)
+        assert stems[0]["stem_name"] == "stem0.wav"
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from stem_mixer.sampler import StemSampler
+from stem_mixer.store import MetadataStore, StoreSampler
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 500
+    index = pd.DataFrame({
+        "stem_name": [f"stem{i}.wav" for i in range(n)],
+        "tempo_bin": rng.choice([60, 100, 120, 240], n),
+        "sound_class": rng.choice(["percussive", "harmonic", "undetermined"], n),
+        "instrument_name": rng.choice(["drums", "bass", "guitar", None], n),
+        "segments": [[0.5, 1.0]] * n,
+    })
+
+    path = str(tmp_path / "index.sqlite")
+    with MetadataStore(path) as store:
+        store.put_many(index.to_dict("records"))
+
+    return path
+
+
+def test_store(store_path):
+    with MetadataStore(store_path) as store:
+        assert len(store) == 500
+        assert "stem3.wav" in store
+        assert "missing.wav" not in store
+
+        stem = store.get_many(["stem3.wav"])[0]
+        assert isinstance(stem["tempo_bin"], int)
+        assert stem["segments"] == [0.5, 1.0]
+
+        df = store.to_dataframe()
+        names = store.stem_names([60, 120], "percussive", exclude_instrument="drums")
+
+    expected = df[
+        df["tempo_bin"].isin([60, 120])
+        & (df["sound_class"] == "percussive")
+        & (df["instrument_name"] != "drums")
+    ]
+    assert names == sorted(expected["stem_name"])
+
+
+def test_store_sampler(store_path):
+    sampler = StoreSampler(store_path)
+
+    with MetadataStore(store_path) as store:
+        expected = StemSampler(store.to_dataframe())
+
+    assert len(sampler) == 500
+    pd.testing.assert_frame_equal(sampler.tempo_table, expected.tempo_table,
+                                  check_names=False, check_index_type=False)
+    assert {
+        tempo_bin: set(instruments)
+        for tempo_bin, instruments in sampler.base_instruments(2, 2).items()
+    } == {
+        tempo_bin: set(instruments)
+        for tempo_bin, instruments in expected.base_instruments(2, 2).items()
+    }
+
+    for seed in range(20):
+        stems, base_tempo = sampler.sample(2, 2, rng=seed)
+        base, others = stems[0], stems[1:]
+
+        assert len(set(s["stem_name"] for s in stems)) == 4
+        assert base["sound_class"] == "percussive"
+        assert all(s["tempo_bin"] in [base_tempo // 2, base_tempo, base_tempo * 2,
+                                      base_tempo * 4] for s in others)
+        if base["instrument_name"] is not None:
+            assert all(s["instrument_name"] != base["instrument_name"] for s in others)
+
+    assert sampler.sample(1, 2, rng=7) == StoreSampler(store_path).sample(1, 2, rng=7)
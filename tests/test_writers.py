@@ -0,0 +1,51 @@
+import os
+import threading
+
+import pytest
+
+from stem_mixer.writers import MixtureWriter, atomic_write
+
+
+def test_writer_runs_all_saves():
+    saved = []
+    lock = threading.Lock()
+
+    def save(mixture_id):
+        with lock:
+            saved.append(mixture_id)
+
+    with MixtureWriter(save, threads=2, max_pending=2) as writer:
+        for i in range(20):
+            writer.submit(i)
+
+    assert sorted(saved) == list(range(20))
+
+
+def test_writer_raises_errors():
+    def save(mixture_id):
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        with MixtureWriter(save, threads=1) as writer:
+            writer.submit(0)
+
+
+def test_atomic_write(tmp_path):
+    path = str(tmp_path / "index.csv")
+
+    with atomic_write(path) as tmp:
+        with open(tmp, "w") as f:
+            f.write("a")
+        assert not os.path.exists(path)
+
+    assert open(path).read() == "a"
+
+    # a failed write keeps the previous file and leaves nothing behind
+    with pytest.raises(ValueError):
+        with atomic_write(path) as tmp:
+            with open(tmp, "w") as f:
+                f.write("b")
+            raise ValueError
+
+    assert open(path).read() == "a"
+    assert os.listdir(tmp_path) == ["index.csv"]